@@ -321,10 +321,14 @@ class ICEPeer:
                 message = await asyncio.wait_for(self.websocket.recv(), timeout=10.0)
                 data = json.loads(message)
                 
-                if data['type'] == 'ice_candidate' and data['from'] == remote_peer:
-                    candidate = ICECandidate.from_dict(data['candidate'])
-                    self.remote_candidates.append(candidate)
-                    logger.info(f"📥 Received candidate from {remote_peer}: {candidate.type.value} {candidate.address}:{candidate.port}")
+                # The signaling server may merge queued messages into one batch frame
+                messages = data['messages'] if data['type'] == 'batch' else [data]
+                
+                for data in messages:
+                    if data['type'] == 'ice_candidate' and data['from'] == remote_peer:
+                        candidate = ICECandidate.from_dict(data['candidate'])
+                        self.remote_candidates.append(candidate)
+                        logger.info(f"📥 Received candidate from {remote_peer}: {candidate.type.value} {candidate.address}:{candidate.port}")
                     
             except asyncio.TimeoutError:
                 logger.warning("⏰ No candidates received, continuing with available ones")
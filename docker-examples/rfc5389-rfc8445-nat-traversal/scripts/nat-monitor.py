@@ -5,36 +5,208 @@ Provides web-based visualization of NAT traversal process.
 """
 
 import asyncio
-import json
 import logging
+import time
+import zlib
+from collections import deque
+from itertools import islice
 from aiohttp import web, WSMsgType
 import aiohttp_cors
+import orjson
+from typing import Dict
 from datetime import datetime
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Number of events kept in history and replayed to newly connected clients
+MAX_EVENTS = 1000
+REPLAY_EVENTS = 50
+
+# Broadcast payloads are deflated once and shared by every client
+COMPRESSION_LEVEL = 1
+
+# Demonstration events replayed by NATMonitor.simulate_events()
+SIMULATED_EVENTS = [
+    "🏠 Alice: Generated host candidate 192.168.1.100:54321",
+    "🌐 Alice: STUN discovery found public IP 203.0.113.50:12345",
+    "🏠 Bob: Generated host candidate 10.0.0.200:43210",
+    "🌐 Bob: STUN discovery found public IP 198.51.100.75:54321",
+    "🤝 Signaling: Exchanging ICE candidates between Alice and Bob",
+    "🔗 ICE: Created 4 candidate pairs for connectivity testing",
+    "🔍 ICE: Testing host -> host connection... SUCCESS",
+    "🎯 ICE: Nominated direct host connection as optimal path",
+    "✅ P2P connection established! Alice ↔ Bob direct connectivity"
+]
+_TIMESTAMP_PREFIX = b'{"timestamp":"'
+
+# Most recent (epoch second, ISO string) pair returned by iso_now()
+_last_timestamp = (0, '')
+
+def iso_now() -> str:
+    """UTC ISO-8601 timestamp, formatted at most once per second"""
+    global _last_timestamp
+    now = int(time.time())
+    if now != _last_timestamp[0]:
+        _last_timestamp = (now, datetime.utcfromtimestamp(now).isoformat())
+    return _last_timestamp[1]
+
+# Monitoring web interface served at /
+INDEX_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>NAT Traversal Monitor</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; background: #f5f5f5; }
+        .container { max-width: 1200px; margin: 0 auto; }
+        .header { background: #2196F3; color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px; }
+        .section { background: white; padding: 15px; margin: 10px 0; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
+        .event { padding: 8px; margin: 5px 0; border-left: 4px solid #4CAF50; background: #f8f9fa; }
+        .event.error { border-left-color: #f44336; }
+        .event.warning { border-left-color: #ff9800; }
+        .timestamp { color: #666; font-size: 0.9em; }
+        .status { display: inline-block; padding: 4px 8px; border-radius: 4px; font-size: 0.8em; }
+        .status.online { background: #4CAF50; color: white; }
+        .status.offline { background: #f44336; color: white; }
+        .grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(300px, 1fr)); gap: 20px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🧊 NAT Traversal Monitor</h1>
+            <p>Real-time visualization of RFC 5389 (STUN) and RFC 8445 (ICE) protocols</p>
+        </div>
+        
+        <div class="grid">
+            <div class="section">
+                <h3>📊 System Status</h3>
+                <div id="status">
+                    <p>🔵 STUN Server: <span class="status online">Online</span></p>
+                    <p>🔄 TURN Server: <span class="status online">Online</span></p>
+                    <p>🌐 Signaling: <span class="status online">Online</span></p>
+                </div>
+            </div>
+            
+            <div class="section">
+                <h3>👥 Active Peers</h3>
+                <div id="peers">
+                    <p>📍 Alice: Gathering candidates...</p>
+                    <p>📍 Bob: Gathering candidates...</p>
+                </div>
+            </div>
+        </div>
+        
+        <div class="section">
+            <h3>📡 Real-time Events</h3>
+            <div id="events" style="height: 400px; overflow-y: auto; border: 1px solid #ddd; padding: 10px;">
+                <p class="event">🚀 NAT Traversal Monitor started</p>
+                <p class="event">🔍 Monitoring STUN, ICE, and signaling traffic...</p>
+            </div>
+        </div>
+        
+        <div class="section">
+            <h3>🎓 Educational Information</h3>
+            <div class="grid">
+                <div>
+                    <h4>RFC 5389 - STUN</h4>
+                    <ul>
+                        <li>Discovers public IP addresses</li>
+                        <li>Identifies NAT types</li>
+                        <li>Enables UDP hole punching</li>
+                    </ul>
+                </div>
+                <div>
+                    <h4>RFC 8445 - ICE</h4>
+                    <ul>
+                        <li>Comprehensive connectivity framework</li>
+                        <li>Multiple candidate types</li>
+                        <li>Systematic connectivity checking</li>
+                    </ul>
+                </div>
+            </div>
+        </div>
+    </div>
+    
+    <script>
+        const eventsDiv = document.getElementById('events');
+        const ws = new WebSocket('ws://localhost:3000/ws');
+        ws.binaryType = 'arraybuffer';
+        let pending = Promise.resolve();
+        
+        function appendEvent(data) {
+            const eventDiv = document.createElement('div');
+            eventDiv.className = 'event ' + (data.level || 'info');
+            eventDiv.innerHTML = '<span class="timestamp">' + data.timestamp + '</span> ' + data.message;
+            eventsDiv.appendChild(eventDiv);
+        }
+        
+        function inflate(buffer) {
+            const stream = new Blob([buffer]).stream().pipeThrough(new DecompressionStream('deflate'));
+            return new Response(stream).text();
+        }
+        
+        ws.onmessage = function(event) {
+            // Events arrive as binary frames of zlib-deflated JSON; chain
+            // decoding so events are rendered in the order they arrived
+            const payload = event.data;
+            pending = pending.then(function() {
+                return typeof payload === 'string' ? payload : inflate(payload);
+            }).then(function(text) {
+                const data = JSON.parse(text);
+                if (data.type === 'replay') {
+                    data.events.forEach(appendEvent);
+                } else {
+                    appendEvent(data);
+                }
+                eventsDiv.scrollTop = eventsDiv.scrollHeight;
+            });
+        };
+        
+        ws.onopen = function() {
+            console.log('Monitor WebSocket connected');
+        };
+        
+        ws.onerror = function(error) {
+            console.error('Monitor WebSocket error:', error);
+        };
+    </script>
+</body>
+</html>
+"""
+
+# Encoded once at import so the index handler never re-encodes the page
+_INDEX_BYTES = INDEX_HTML.encode('utf-8')
+
 class NATMonitor:
     """Web-based NAT traversal monitoring"""
     
     def __init__(self, host='0.0.0.0', port=3000):
         self.host = host
         self.port = port
-        self.websockets = set()
-        self.events = []
+        self.websockets: Dict[int, web.WebSocketResponse] = {}
+        self.events = deque(maxlen=MAX_EVENTS)
+        self._replay_cache = None
+        
+        # Simulated events serialized once; only the timestamp is spliced in per send
+        self._sim_blobs = [
+            orjson.dumps({'message': message, 'level': 'info'})[1:]
+            for message in SIMULATED_EVENTS
+        ]
         
     async def websocket_handler(self, request):
         """Handle WebSocket connections for real-time updates"""
-        ws = web.WebSocketResponse()
+        # Per-connection permessage-deflate would recompress every broadcast
+        ws = web.WebSocketResponse(compress=False)
         await ws.prepare(request)
         
-        self.websockets.add(ws)
+        self.websockets[id(ws)] = ws
         logger.info(f"📡 New monitor client connected")
         
-        # Send existing events to new client
-        for event in self.events[-50:]:  # Last 50 events
-            await ws.send_str(json.dumps(event))
+        # Send recent events to new client as a single replay frame
+        await ws.send_bytes(self._get_replay_payload())
             
         try:
             async for msg in ws:
@@ -46,162 +218,65 @@ class NATMonitor:
         except Exception as e:
             logger.error(f"WebSocket handler error: {e}")
         finally:
-            self.websockets.discard(ws)
+            self.websockets.pop(id(ws), None)
             logger.info("📡 Monitor client disconnected")
             
         return ws
         
+    def _get_replay_payload(self):
+        """Serialize the recent event history once and reuse it until it changes"""
+        if self._replay_cache is None:
+            recent = list(islice(self.events, max(0, len(self.events) - REPLAY_EVENTS), None))
+            payload = orjson.dumps({'type': 'replay', 'events': recent})
+            self._replay_cache = zlib.compress(payload, COMPRESSION_LEVEL)
+        return self._replay_cache
+        
     async def index_handler(self, request):
         """Serve the monitoring web interface"""
-        html_content = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>NAT Traversal Monitor</title>
-            <style>
-                body { font-family: Arial, sans-serif; margin: 20px; background: #f5f5f5; }
-                .container { max-width: 1200px; margin: 0 auto; }
-                .header { background: #2196F3; color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px; }
-                .section { background: white; padding: 15px; margin: 10px 0; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
-                .event { padding: 8px; margin: 5px 0; border-left: 4px solid #4CAF50; background: #f8f9fa; }
-                .event.error { border-left-color: #f44336; }
-                .event.warning { border-left-color: #ff9800; }
-                .timestamp { color: #666; font-size: 0.9em; }
-                .status { display: inline-block; padding: 4px 8px; border-radius: 4px; font-size: 0.8em; }
-                .status.online { background: #4CAF50; color: white; }
-                .status.offline { background: #f44336; color: white; }
-                .grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(300px, 1fr)); gap: 20px; }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🧊 NAT Traversal Monitor</h1>
-                    <p>Real-time visualization of RFC 5389 (STUN) and RFC 8445 (ICE) protocols</p>
-                </div>
-                
-                <div class="grid">
-                    <div class="section">
-                        <h3>📊 System Status</h3>
-                        <div id="status">
-                            <p>🔵 STUN Server: <span class="status online">Online</span></p>
-                            <p>🔄 TURN Server: <span class="status online">Online</span></p>
-                            <p>🌐 Signaling: <span class="status online">Online</span></p>
-                        </div>
-                    </div>
-                    
-                    <div class="section">
-                        <h3>👥 Active Peers</h3>
-                        <div id="peers">
-                            <p>📍 Alice: Gathering candidates...</p>
-                            <p>📍 Bob: Gathering candidates...</p>
-                        </div>
-                    </div>
-                </div>
-                
-                <div class="section">
-                    <h3>📡 Real-time Events</h3>
-                    <div id="events" style="height: 400px; overflow-y: auto; border: 1px solid #ddd; padding: 10px;">
-                        <p class="event">🚀 NAT Traversal Monitor started</p>
-                        <p class="event">🔍 Monitoring STUN, ICE, and signaling traffic...</p>
-                    </div>
-                </div>
-                
-                <div class="section">
-                    <h3>🎓 Educational Information</h3>
-                    <div class="grid">
-                        <div>
-                            <h4>RFC 5389 - STUN</h4>
-                            <ul>
-                                <li>Discovers public IP addresses</li>
-                                <li>Identifies NAT types</li>
-                                <li>Enables UDP hole punching</li>
-                            </ul>
-                        </div>
-                        <div>
-                            <h4>RFC 8445 - ICE</h4>
-                            <ul>
-                                <li>Comprehensive connectivity framework</li>
-                                <li>Multiple candidate types</li>
-                                <li>Systematic connectivity checking</li>
-                            </ul>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            
-            <script>
-                const eventsDiv = document.getElementById('events');
-                const ws = new WebSocket('ws://localhost:3000/ws');
-                
-                ws.onmessage = function(event) {
-                    const data = JSON.parse(event.data);
-                    const eventDiv = document.createElement('div');
-                    eventDiv.className = 'event ' + (data.level || 'info');
-                    eventDiv.innerHTML = '<span class="timestamp">' + data.timestamp + '</span> ' + data.message;
-                    eventsDiv.appendChild(eventDiv);
-                    eventsDiv.scrollTop = eventsDiv.scrollHeight;
-                };
-                
-                ws.onopen = function() {
-                    console.log('Monitor WebSocket connected');
-                };
-                
-                ws.onerror = function(error) {
-                    console.error('Monitor WebSocket error:', error);
-                };
-            </script>
-        </body>
-        </html>
-        """
-        return web.Response(text=html_content, content_type='text/html')
+        return web.Response(body=_INDEX_BYTES, content_type='text/html', charset='utf-8')
+        
+    def _record_event(self, event):
+        """Append an event to the replay history"""
+        # Bounded deque drops the oldest event once MAX_EVENTS is reached
+        self.events.append(event)
+        self._replay_cache = None
         
+    async def _broadcast_bytes(self, payload):
+        """Send an already-serialized event to all connected clients"""
+        if self.websockets:
+            event_json = zlib.compress(payload, COMPRESSION_LEVEL)
+            clients = list(self.websockets.values())
+            
+            # Send concurrently without wrapping each send in its own Task
+            results = await asyncio.gather(
+                *(ws.send_bytes(event_json) for ws in clients),
+                return_exceptions=True
+            )
+                    
+            # Remove disconnected clients
+            for ws, result in zip(clients, results):
+                if isinstance(result, Exception):
+                    self.websockets.pop(id(ws), None)
+                    
     async def broadcast_event(self, message, level='info'):
         """Broadcast event to all connected clients"""
         event = {
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': iso_now(),
             'message': message,
             'level': level
         }
         
-        self.events.append(event)
-        
-        # Keep only last 1000 events
-        if len(self.events) > 1000:
-            self.events = self.events[-1000:]
-            
-        # Broadcast to all connected clients
-        if self.websockets:
-            event_json = json.dumps(event)
-            disconnected = set()
-            
-            for ws in self.websockets:
-                try:
-                    await ws.send_str(event_json)
-                except Exception:
-                    disconnected.add(ws)
-                    
-            # Remove disconnected clients
-            self.websockets -= disconnected
+        self._record_event(event)
+        await self._broadcast_bytes(orjson.dumps(event))
             
     async def simulate_events(self):
         """Simulate NAT traversal events for demonstration"""
-        events = [
-            "🏠 Alice: Generated host candidate 192.168.1.100:54321",
-            "🌐 Alice: STUN discovery found public IP 203.0.113.50:12345",
-            "🏠 Bob: Generated host candidate 10.0.0.200:43210", 
-            "🌐 Bob: STUN discovery found public IP 198.51.100.75:54321",
-            "🤝 Signaling: Exchanging ICE candidates between Alice and Bob",
-            "🔗 ICE: Created 4 candidate pairs for connectivity testing",
-            "🔍 ICE: Testing host -> host connection... SUCCESS",
-            "🎯 ICE: Nominated direct host connection as optimal path",
-            "✅ P2P connection established! Alice ↔ Bob direct connectivity"
-        ]
-        
         await asyncio.sleep(10)  # Wait for services to start
         
-        for event in events:
-            await self.broadcast_event(event)
+        for message, event_tail in zip(SIMULATED_EVENTS, self._sim_blobs):
+            timestamp = iso_now()
+            self._record_event({'timestamp': timestamp, 'message': message, 'level': 'info'})
+            await self._broadcast_bytes(_TIMESTAMP_PREFIX + timestamp.encode() + b'",' + event_tail)
             await asyncio.sleep(3)  # Space out events
             
         # Continue with periodic status updates
@@ -233,9 +308,6 @@ class NATMonitor:
                 )
             })
             
-        # Start event simulation
-        asyncio.create_task(self.simulate_events())
-        
         logger.info("✅ NAT Monitor started successfully")
         logger.info(f"🌐 Web interface: http://localhost:{self.port}")
         
@@ -243,11 +315,15 @@ class NATMonitor:
         runner = web.AppRunner(app)
         await runner.setup()
         
-        site = web.TCPSite(runner, self.host, self.port)
-        await site.start()
-        
         try:
-            await asyncio.Future()  # Run forever
+            # Event simulation is cancelled and awaited before the runner is cleaned up
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(self.simulate_events())
+                
+                site = web.TCPSite(runner, self.host, self.port)
+                await site.start()
+                
+                await asyncio.Future()  # Run forever
         except KeyboardInterrupt:
             logger.info("🛑 NAT Monitor shutting down")
         finally:
@@ -267,6 +343,13 @@ def main():
     
     monitor = NATMonitor(host, port)
     
+    # Use libuv's event loop when available; fall back to the default loop
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+        
     try:
         asyncio.run(monitor.run_monitor())
     except KeyboardInterrupt:
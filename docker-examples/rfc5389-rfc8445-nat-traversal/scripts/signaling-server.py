@@ -7,46 +7,163 @@ Facilitates WebSocket-based communication between ICE peers for RFC 8445 demonst
 import asyncio
 import json
 import logging
+import re
+import struct
+import time
 import websockets
-from typing import Dict, Set
+from typing import Dict, Optional, Set, Tuple
+from dataclasses import dataclass
 from datetime import datetime
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Outbound messages buffered per peer before relays to it start being dropped
+PEER_QUEUE_SIZE = 256
+
+# Maximum number of queued messages merged into a single batch frame
+MAX_BATCH_SIZE = 32
+
+# Keepalive replies are pre-built so a ping never touches the JSON encoder
+_PONG_PREFIX = '{"type": "pong", "timestamp": "'
+_PONG_SUFFIX = '"}'
+
+# Message types forwarded verbatim from one peer to another
+RELAY_TYPES = frozenset({'ice_candidate', 'offer', 'answer'})
+
+# Leading "type"/"from"/"to" members of a JSON relay message, in either from/to
+# order, so relays can be routed without decoding the whole message
+_RELAY_HEADER = re.compile(
+    r'\{\s*"type":\s*"(ice_candidate|offer|answer)",'
+    r'\s*"(from|to)":\s*"([^"\\]+)",'
+    r'\s*"(from|to)":\s*"([^"\\]+)"'
+)
+
+def sniff_relay_header(message: str) -> Optional[Tuple[str, str, str]]:
+    """Return (type, from, to) if a JSON message starts with a relay header"""
+    match = _RELAY_HEADER.match(message)
+    if match is None:
+        return None
+    message_type, key1, value1, key2, value2 = match.groups()
+    if key1 == key2:
+        return None
+    if key1 == 'from':
+        return message_type, value1, value2
+    return message_type, value2, value1
+
+# Binary relay encoding a peer can opt into at registration ({"codec": "msgpack"})
+CODEC_JSON = 'json'
+CODEC_MSGPACK = 'msgpack'
+
+# msgpack batch frame up to (but excluding) the messages array header, so
+# queued msgpack messages can be concatenated without re-encoding them
+_MSGPACK_BATCH_PREFIX = msgpack.packb({'type': 'batch', 'messages': []})[:-1] if msgpack else b''
+
+# Most recent (epoch second, ISO string) pair returned by iso_now()
+_last_timestamp = (0, '')
+
+def iso_now() -> str:
+    """UTC ISO-8601 timestamp, formatted at most once per second"""
+    global _last_timestamp
+    now = int(time.time())
+    if now != _last_timestamp[0]:
+        _last_timestamp = (now, datetime.utcfromtimestamp(now).isoformat())
+    return _last_timestamp[1]
+
+@dataclass
+class PeerConnection:
+    """Registered peer with its outbound message queue and writer task"""
+    websocket: websockets.WebSocketServerProtocol
+    queue: asyncio.Queue
+    writer: asyncio.Task
+    codec: str = CODEC_JSON
+    
+    def encode(self, message: dict):
+        """Serialize a relayed message in the codec this peer registered with"""
+        if self.codec == CODEC_MSGPACK:
+            return msgpack.packb(message)
+        return json.dumps(message)
+
 class SignalingServer:
     """Educational signaling server for ICE candidate exchange"""
     
     def __init__(self, host='0.0.0.0', port=8080):
         self.host = host
         self.port = port
-        self.peers: Dict[str, websockets.WebSocketServerProtocol] = {}
+        self.peers: Dict[str, PeerConnection] = {}
         self.stats = {
             'connections': 0,
             'messages_relayed': 0,
             'peers_registered': 0,
             'candidates_exchanged': 0
         }
+        # JSON array of active peer names, rebuilt only after peers change
+        self._peer_names_json: Optional[str] = None
+        
+    def _active_peers_json(self) -> str:
+        """Serialized list of active peer names, cached until the next (un)registration"""
+        if self._peer_names_json is None:
+            self._peer_names_json = json.dumps(list(self.peers))
+        return self._peer_names_json
         
-    async def register_peer(self, websocket: websockets.WebSocketServerProtocol, peer_name: str):
+    async def _writer(self, websocket: websockets.WebSocketServerProtocol, queue: asyncio.Queue, codec: str):
+        """Drain a peer's outbound queue so slow consumers don't stall senders"""
+        # Bind hot-loop callables to locals to skip repeated attribute lookups
+        get, get_nowait, empty, send = queue.get, queue.get_nowait, queue.empty, websocket.send
+        try:
+            while True:
+                batch = [await get()]
+                while not empty() and len(batch) < MAX_BATCH_SIZE:
+                    batch.append(get_nowait())
+                    
+                if len(batch) == 1:
+                    await send(batch[0])
+                elif codec == CODEC_MSGPACK:
+                    # array16 header followed by the already-packed messages
+                    await send(
+                        _MSGPACK_BATCH_PREFIX + b'\xdc' + struct.pack('>H', len(batch)) + b''.join(batch)
+                    )
+                else:
+                    # Queued messages are already JSON, so splice them into one frame
+                    await send('{"type": "batch", "messages": [' + ', '.join(batch) + ']}')
+        except websockets.ConnectionClosed:
+            pass
+            
+    async def register_peer(self, websocket: websockets.WebSocketServerProtocol, peer_name: str, codec: str = CODEC_JSON):
         """Register a new peer"""
         if peer_name in self.peers:
             logger.warning(f"⚠️  Peer {peer_name} already registered, replacing connection")
+            self.peers[peer_name].writer.cancel()
+            
+        if codec == CODEC_MSGPACK and msgpack is None:
+            logger.warning(f"⚠️  msgpack not installed, relaying to {peer_name} as JSON")
+            codec = CODEC_JSON
+        elif codec not in (CODEC_JSON, CODEC_MSGPACK):
+            logger.warning(f"⚠️  Unknown codec {codec} requested by {peer_name}, using JSON")
+            codec = CODEC_JSON
             
-        self.peers[peer_name] = websocket
+        queue = asyncio.Queue(maxsize=PEER_QUEUE_SIZE)
+        writer = asyncio.create_task(self._writer(websocket, queue, codec))
+        self.peers[peer_name] = PeerConnection(websocket, queue, writer, codec)
+        self._peer_names_json = None
         self.stats['peers_registered'] += 1
         
-        logger.info(f"✅ Peer registered: {peer_name}")
-        logger.info(f"📊 Active peers: {list(self.peers.keys())}")
+        active_peers = self._active_peers_json()
+        logger.info(f"✅ Peer registered: {peer_name} (codec: {codec})")
+        logger.info(f"📊 Active peers: {active_peers}")
         
         # Notify about successful registration
-        response = {
-            'type': 'registration_success',
-            'peer_name': peer_name,
-            'active_peers': list(self.peers.keys())
-        }
-        await websocket.send(json.dumps(response))
+        response = (
+            '{"type": "registration_success", "peer_name": ' + json.dumps(peer_name) +
+            ', "active_peers": ' + active_peers + '}'
+        )
+        await websocket.send(response)
         
     async def relay_message(self, from_peer: str, to_peer: str, message: dict):
         """Relay message between peers"""
@@ -59,30 +176,84 @@ class SignalingServer:
             }
             
             if from_peer in self.peers:
-                await self.peers[from_peer].send(json.dumps(error_response))
+                try:
+                    sender = self.peers[from_peer]
+                    sender.queue.put_nowait(sender.encode(error_response))
+                except asyncio.QueueFull:
+                    pass
             return
             
         try:
-            target_websocket = self.peers[to_peer]
-            await target_websocket.send(json.dumps(message))
+            # Encoding in the target's codec transcodes between JSON and msgpack peers
+            target = self.peers[to_peer]
+            target.queue.put_nowait(target.encode(message))
             
             self.stats['messages_relayed'] += 1
             
+            # Per-message relay logs are debug-only; the counters feed log_statistics()
             if message.get('type') == 'ice_candidate':
                 self.stats['candidates_exchanged'] += 1
-                candidate = message.get('candidate', {})
-                logger.info(f"🔀 Relayed ICE candidate: {from_peer} -> {to_peer}")
-                logger.info(f"   Type: {candidate.get('type', 'unknown')}")
-                logger.info(f"   Address: {candidate.get('address', 'unknown')}:{candidate.get('port', 'unknown')}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    candidate = message.get('candidate', {})
+                    logger.debug(
+                        "🔀 Relayed ICE candidate: %s -> %s type=%s addr=%s:%s",
+                        from_peer, to_peer, candidate.get('type', 'unknown'),
+                        candidate.get('address', 'unknown'), candidate.get('port', 'unknown')
+                    )
             else:
-                logger.info(f"📨 Relayed message: {from_peer} -> {to_peer} (type: {message.get('type', 'unknown')})")
+                logger.debug("📨 Relayed message: %s -> %s (type: %s)", from_peer, to_peer, message.get('type', 'unknown'))
                 
+        except asyncio.QueueFull:
+            logger.warning(f"⚠️  Outbound queue full for {to_peer}, dropping message from {from_peer}")
         except Exception as e:
             logger.error(f"❌ Failed to relay message to {to_peer}: {e}")
             
+    def relay_raw(self, from_peer: str, to_peer: str, message_type: str, raw: str) -> bool:
+        """Forward an undecoded JSON relay message; False means it needs the full relay path"""
+        target = self.peers.get(to_peer)
+        if target is None or target.codec != CODEC_JSON:
+            # Missing peers get an error reply and msgpack peers need transcoding
+            return False
+            
+        try:
+            target.queue.put_nowait(raw)
+        except asyncio.QueueFull:
+            logger.warning(f"⚠️  Outbound queue full for {to_peer}, dropping message from {from_peer}")
+            return True
+            
+        self.stats['messages_relayed'] += 1
+        if message_type == 'ice_candidate':
+            self.stats['candidates_exchanged'] += 1
+        logger.debug("📨 Relayed message: %s -> %s (type: %s)", from_peer, to_peer, message_type)
+        return True
+        
+    async def handle_ping(self, websocket: websockets.WebSocketServerProtocol, data: dict):
+        """Respond to ping with pong"""
+        await websocket.send(_PONG_PREFIX + iso_now() + _PONG_SUFFIX)
+        
+    async def handle_get_stats(self, websocket: websockets.WebSocketServerProtocol, data: dict):
+        """Send current server statistics"""
+        stats_response = (
+            '{"type": "stats", "stats": ' + json.dumps(self.stats) +
+            ', "active_peers": ' + self._active_peers_json() +
+            ', "timestamp": "' + iso_now() + '"}'
+        )
+        await websocket.send(stats_response)
+        
+    # Request/response message types answered directly on the sender's connection
+    MESSAGE_HANDLERS = {
+        'ping': handle_ping,
+        'get_stats': handle_get_stats
+    }
+    
     async def handle_peer_connection(self, websocket: websockets.WebSocketServerProtocol, path: str):
         """Handle individual peer WebSocket connection"""
         peer_name = None
+        # Bind hot-loop callables to locals to skip repeated attribute lookups
+        loads = json.loads
+        unpackb = msgpack.unpackb if msgpack is not None else None
+        relay_message = self.relay_message
+        relay_raw = self.relay_raw
         
         try:
             self.stats['connections'] += 1
@@ -90,51 +261,36 @@ class SignalingServer:
             
             async for message in websocket:
                 try:
-                    data = json.loads(message)
+                    # JSON relays are forwarded verbatim when the header alone identifies them
+                    if isinstance(message, str):
+                        header = sniff_relay_header(message)
+                        if header is not None and relay_raw(header[1], header[2], header[0], message):
+                            continue
+                            
+                    # msgpack peers send binary frames; everything else is JSON text
+                    if isinstance(message, bytes) and unpackb is not None:
+                        data = unpackb(message)
+                    else:
+                        data = loads(message)
                     message_type = data.get('type')
                     
-                    if message_type == 'register':
+                    if message_type in RELAY_TYPES:
+                        try:
+                            from_peer, to_peer = data['from'], data['to']
+                        except KeyError:
+                            logger.warning(f"❌ {message_type} missing from/to fields")
+                        else:
+                            await relay_message(from_peer, to_peer, data)
+                            
+                    elif message_type == 'register':
                         peer_name = data.get('peer_name')
                         if peer_name:
-                            await self.register_peer(websocket, peer_name)
+                            await self.register_peer(websocket, peer_name, data.get('codec', CODEC_JSON))
                         else:
                             logger.warning("❌ Registration without peer name")
                             
-                    elif message_type == 'ice_candidate':
-                        from_peer = data.get('from')
-                        to_peer = data.get('to')
-                        
-                        if from_peer and to_peer:
-                            await self.relay_message(from_peer, to_peer, data)
-                        else:
-                            logger.warning("❌ ICE candidate missing from/to fields")
-                            
-                    elif message_type == 'offer' or message_type == 'answer':
-                        from_peer = data.get('from')
-                        to_peer = data.get('to')
-                        
-                        if from_peer and to_peer:
-                            await self.relay_message(from_peer, to_peer, data)
-                        else:
-                            logger.warning(f"❌ SDP {message_type} missing from/to fields")
-                            
-                    elif message_type == 'ping':
-                        # Respond to ping with pong
-                        pong_response = {
-                            'type': 'pong',
-                            'timestamp': datetime.utcnow().isoformat()
-                        }
-                        await websocket.send(json.dumps(pong_response))
-                        
-                    elif message_type == 'get_stats':
-                        # Send current server statistics
-                        stats_response = {
-                            'type': 'stats',
-                            'stats': self.stats.copy(),
-                            'active_peers': list(self.peers.keys()),
-                            'timestamp': datetime.utcnow().isoformat()
-                        }
-                        await websocket.send(json.dumps(stats_response))
+                    elif message_type in self.MESSAGE_HANDLERS:
+                        await self.MESSAGE_HANDLERS[message_type](self, websocket, data)
                         
                     else:
                         logger.warning(f"❓ Unknown message type: {message_type}")
@@ -150,8 +306,9 @@ class SignalingServer:
             logger.error(f"❌ WebSocket error: {e}")
         finally:
             # Clean up peer registration
-            if peer_name and peer_name in self.peers:
-                del self.peers[peer_name]
+            if peer_name and peer_name in self.peers and self.peers[peer_name].websocket is websocket:
+                self.peers.pop(peer_name).writer.cancel()
+                self._peer_names_json = None
                 logger.info(f"🧹 Cleaned up peer: {peer_name}")
                 
     async def log_statistics(self):
@@ -170,26 +327,26 @@ class SignalingServer:
         """Run the signaling server"""
         logger.info(f"🚀 Starting signaling server on {self.host}:{self.port}")
         
-        # Start statistics logging task
-        stats_task = asyncio.create_task(self.log_statistics())
-        
         try:
             logger.info("✅ Signaling server started successfully")
             logger.info("📋 Supported message types:")
-            logger.info("   • register: Register peer with server")
+            logger.info("   • register: Register peer with server (optional codec: json/msgpack)")
             logger.info("   • ice_candidate: Exchange ICE candidates")
             logger.info("   • offer/answer: Exchange SDP offers/answers")
             logger.info("   • ping/pong: Connection keepalive")
             logger.info("   • get_stats: Retrieve server statistics")
+            logger.info("   • batch: Several queued messages merged into one frame")
             
-            async with websockets.serve(self.handle_peer_connection, self.host, self.port):
-                await asyncio.Future()  # Run forever
+            # Statistics logging is cancelled and awaited when the server stops
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(self.log_statistics())
+                
+                async with websockets.serve(self.handle_peer_connection, self.host, self.port):
+                    await asyncio.Future()  # Run forever
                 
         except KeyboardInterrupt:
             logger.info("🛑 Shutting down signaling server...")
         finally:
-            stats_task.cancel()
-            
             logger.info("📊 Final Statistics:")
             logger.info(f"   Total connections served: {self.stats['connections']}")
             logger.info(f"   Total messages relayed: {self.stats['messages_relayed']}")
@@ -211,6 +368,13 @@ def main():
     
     server = SignalingServer(host, port)
     
+    # Use libuv's event loop when available; fall back to the default loop
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+        
     try:
         asyncio.run(server.run_server())
     except KeyboardInterrupt:
@@ -5,27 +5,75 @@ Demonstrates RFC 5389 STUN protocol for NAT traversal education.
 """
 
 import asyncio
+import hashlib
+import math
 import socket
 import struct
 import secrets
 import time
 import logging
-from typing import Dict, Tuple, Optional
-from dataclasses import dataclass
+from typing import Tuple, Optional
 from datetime import datetime
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-@dataclass
-class STUNMessage:
-    """STUN message structure"""
-    message_type: int
-    message_length: int
-    magic_cookie: int
-    transaction_id: bytes
-    attributes: Dict[int, bytes]
+# Precompiled wire formats: message header, attribute TLV header, XOR-MAPPED-ADDRESS value
+_HDR = struct.Struct('>HHI12s')
+_TLV = struct.Struct('>HH')
+_XOR_ADDR = struct.Struct('>HHI')
+_XOR_PORT_IP = struct.Struct('>HI')
+
+# Magic cookie as it appears on the wire, compared before any header parsing
+_COOKIE_BYTES = (0x2112A442).to_bytes(4, 'big')
+
+# Kernel receive buffer requested for the UDP socket so request bursts queue
+# instead of being dropped (Linux caps this at net.core.rmem_max)
+RECV_BUFFER_SIZE = 4 << 20
+
+class HyperLogLog:
+    """Approximate distinct counter with fixed memory (2**p one-byte registers)"""
+    
+    def __init__(self, p: int = 14):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+        self.alpha = 0.7213 / (1 + 1.079 / self.m)
+        
+    def add(self, value: bytes):
+        """Record a value; repeated values never change the registers"""
+        x = int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'big')
+        index = x >> (64 - self.p)
+        remaining = x & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            
+    def __len__(self) -> int:
+        """Estimated number of distinct values added"""
+        estimate = self.alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Linear counting is more accurate while many registers are still empty
+            estimate = self.m * math.log(self.m / zeros)
+        return round(estimate)
+
+class STUNProtocol(asyncio.DatagramProtocol):
+    """Datagram protocol feeding received packets straight into the STUN server"""
+    
+    def __init__(self, server: 'STUNServer'):
+        self.server = server
+        
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self.server.transport = transport
+        
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]):
+        self.server.handle_stun_request(data, addr)
+        
+    def error_received(self, exc: Exception):
+        logger.error(f"Server error: {exc}")
+        self.server.stats['errors'] += 1
 
 class STUNServer:
     """Educational STUN server implementation"""
@@ -44,113 +92,87 @@ class STUNServer:
     SOFTWARE = 0x8022
     FINGERPRINT = 0x8028
     
+    SOFTWARE_NAME = "Educational STUN Server (RFC 5389 Demo)"
+    
     def __init__(self, host='0.0.0.0', port=3478):
         self.host = host
         self.port = port
         self.socket = None
+        self.transport: Optional[asyncio.DatagramTransport] = None
         self.running = False
         self.stats = {
             'requests_received': 0,
             'responses_sent': 0,
             'errors': 0,
-            'unique_clients': set()
+            # Approximate, so memory stays constant however many clients appear
+            'unique_clients': HyperLogLog()
         }
         
-    def parse_stun_message(self, data: bytes) -> Optional[STUNMessage]:
-        """Parse incoming STUN message"""
+        # The SOFTWARE attribute never changes: build its TLV (header + value + padding) once
+        software = self.SOFTWARE_NAME.encode('utf-8')
+        self._software_tlv = (
+            _TLV.pack(self.SOFTWARE, len(software)) + software +
+            b'\x00' * (-len(software) & 3)
+        )
+        
+        # ...so every Binding Response (header + XOR-MAPPED-ADDRESS + SOFTWARE) is the
+        # same template apart from the transaction ID (bytes 8-20) and XOR port/IP (26-32)
+        length = _HDR.size + _TLV.size + _XOR_ADDR.size + len(self._software_tlv)
+        self._binding_template = bytearray(length)
+        _HDR.pack_into(self._binding_template, 0, self.BINDING_RESPONSE, length - 20, self.MAGIC_COOKIE, bytes(12))
+        _TLV.pack_into(self._binding_template, 20, self.XOR_MAPPED_ADDRESS, _XOR_ADDR.size)
+        _XOR_ADDR.pack_into(self._binding_template, 24, 1, 0, 0)  # Family (IPv4=1), XOR-Port, XOR-Address
+        self._binding_template[32:] = self._software_tlv
+        
+        # Every rejected request gets the same 400 Bad Request; only the
+        # transaction ID (bytes 8-20) is patched in before sending. The transport
+        # copies the buffer if it has to queue it, so one shared template is safe.
+        self._bad_request = bytearray(self.create_error_response(bytes(12), 400, "Bad Request"))
+        
+    def parse_stun_message(self, data: bytes) -> Optional[Tuple[int, bytes]]:
+        """Parse incoming STUN message header into (message_type, transaction_id)"""
         try:
             if len(data) < 20:
                 return None
                 
-            # Parse header
-            header = struct.unpack('>HHI12s', data[:20])
-            message_type = header[0]
-            message_length = header[1]
-            magic_cookie = header[2]
-            transaction_id = header[3]
-            
-            # Verify magic cookie
-            if magic_cookie != self.MAGIC_COOKIE:
-                logger.warning(f"Invalid magic cookie: {magic_cookie:#x}")
+            # Verify magic cookie first so junk is rejected before parsing anything
+            if data[4:8] != _COOKIE_BYTES:
+                logger.warning("Invalid magic cookie: %#x", int.from_bytes(data[4:8], 'big'))
                 return None
                 
-            # Parse attributes
-            attributes = {}
-            offset = 20
+            # Parse header
+            message_type = (data[0] << 8) | data[1]
+            transaction_id = data[8:20]
             
-            while offset < len(data) and offset < 20 + message_length:
-                if offset + 4 > len(data):
-                    break
-                    
-                attr_type, attr_length = struct.unpack('>HH', data[offset:offset+4])
-                attr_value = data[offset+4:offset+4+attr_length]
-                
-                attributes[attr_type] = attr_value
-                
-                # Move to next attribute (pad to 4-byte boundary)
-                offset += 4 + attr_length
-                if attr_length % 4:
-                    offset += 4 - (attr_length % 4)
-                    
-            return STUNMessage(
-                message_type=message_type,
-                message_length=message_length,
-                magic_cookie=magic_cookie,
-                transaction_id=transaction_id,
-                attributes=attributes
-            )
+            # Attributes are not parsed: neither the Binding Response nor the
+            # 400 error reply depends on anything but the type and transaction ID
+            return message_type, transaction_id
             
         except Exception as e:
             logger.error(f"Error parsing STUN message: {e}")
             return None
             
-    def create_xor_mapped_address(self, ip: str, port: int, transaction_id: bytes) -> bytes:
-        """Create XOR-MAPPED-ADDRESS attribute"""
+    def create_xor_mapped_address(self, ip: str, port: int) -> Tuple[int, int]:
+        """Compute the XOR-MAPPED-ADDRESS port and address values"""
         # Convert IP to integer
-        ip_parts = [int(x) for x in ip.split('.')]
-        ip_int = (ip_parts[0] << 24) + (ip_parts[1] << 16) + (ip_parts[2] << 8) + ip_parts[3]
+        ip_int = int.from_bytes(socket.inet_aton(ip), 'big')
         
         # XOR with magic cookie
         xor_port = port ^ (self.MAGIC_COOKIE >> 16)
         xor_ip = ip_int ^ self.MAGIC_COOKIE
         
-        # Pack as address attribute
-        # Family (IPv4=1), XOR-Port, XOR-Address
-        return struct.pack('>HHI', 1, xor_port, xor_ip)
-        
-    def create_software_attribute(self) -> bytes:
-        """Create SOFTWARE attribute"""
-        software = "Educational STUN Server (RFC 5389 Demo)"
-        return software.encode('utf-8')
+        return xor_port, xor_ip
         
-    def create_binding_response(self, transaction_id: bytes, client_addr: Tuple[str, int]) -> bytes:
+    def create_binding_response(self, transaction_id: bytes, client_addr: Tuple[str, int]) -> bytearray:
         """Create STUN Binding Response"""
-        attributes = []
+        xor_port, xor_ip = self.create_xor_mapped_address(client_addr[0], client_addr[1])
         
-        # XOR-MAPPED-ADDRESS attribute
-        xor_mapped = self.create_xor_mapped_address(client_addr[0], client_addr[1], transaction_id)
-        attr_header = struct.pack('>HH', self.XOR_MAPPED_ADDRESS, len(xor_mapped))
-        attributes.append(attr_header + xor_mapped)
-        
-        # SOFTWARE attribute
-        software = self.create_software_attribute()
-        # Pad to 4-byte boundary
-        software_padded = software + b'\x00' * ((4 - len(software) % 4) % 4)
-        attr_header = struct.pack('>HH', self.SOFTWARE, len(software))
-        attributes.append(attr_header + software_padded)
+        # Copy the template and patch only the per-request fields
+        response = self._binding_template[:]
+        response[8:20] = transaction_id
+        _XOR_PORT_IP.pack_into(response, 26, xor_port, xor_ip)
         
-        # Calculate total attribute length
-        attr_data = b''.join(attributes)
-        message_length = len(attr_data)
-        
-        # Create header
-        header = struct.pack('>HHI12s', 
-                           self.BINDING_RESPONSE,
-                           message_length,
-                           self.MAGIC_COOKIE,
-                           transaction_id)
-        
-        return header + attr_data
+        return response
         
     def create_error_response(self, transaction_id: bytes, error_code: int, reason: str) -> bytes:
         """Create STUN Error Response"""
@@ -162,54 +184,51 @@ class STUNServer:
         # Error attribute: Class(1), Number(1), Reason(variable)
         error_attr = struct.pack('>HHI', 0, (error_class << 8) | error_number, 0) + reason_bytes
         # Pad to 4-byte boundary
-        error_attr += b'\x00' * ((4 - len(error_attr) % 4) % 4)
+        error_attr += b'\x00' * (-len(error_attr) & 3)
         
-        attr_header = struct.pack('>HH', 0x0009, len(error_attr) - 4)  # ERROR-CODE attribute
+        attr_header = _TLV.pack(0x0009, len(error_attr) - 4)  # ERROR-CODE attribute
         attr_data = attr_header + error_attr
         
         # Create header
-        header = struct.pack('>HHI12s',
-                           self.BINDING_ERROR,
+        header = _HDR.pack(self.BINDING_ERROR,
                            len(attr_data),
                            self.MAGIC_COOKIE,
                            transaction_id)
         
         return header + attr_data
         
-    async def handle_stun_request(self, data: bytes, client_addr: Tuple[str, int]):
-        """Handle incoming STUN request"""
+    def handle_stun_request(self, data: bytes, client_addr: Tuple[str, int]):
+        """Handle incoming STUN request (called synchronously from STUNProtocol)"""
         try:
             self.stats['requests_received'] += 1
-            self.stats['unique_clients'].add(client_addr[0])
+            self.stats['unique_clients'].add(client_addr[0].encode())
             
-            logger.info(f"📥 STUN request from {client_addr[0]}:{client_addr[1]}")
+            # Per-request detail is DEBUG-only and lazily formatted to keep the hot path cheap
+            logger.debug("📥 STUN request from %s:%d", client_addr[0], client_addr[1])
             
             # Parse message
-            message = self.parse_stun_message(data)
-            if not message:
-                logger.warning(f"Invalid STUN message from {client_addr}")
+            parsed = self.parse_stun_message(data)
+            if not parsed:
+                logger.warning("Invalid STUN message from %s", client_addr)
                 return
+            message_type, transaction_id = parsed
                 
             # Handle different message types
-            if message.message_type == self.BINDING_REQUEST:
-                logger.info(f"🔍 Processing Binding Request (TxID: {message.transaction_id.hex()[:8]}...)")
+            if message_type == self.BINDING_REQUEST:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("🔍 Processing Binding Request (TxID: %s...)", transaction_id[:4].hex())
                 
                 # Create and send response
-                response = self.create_binding_response(message.transaction_id, client_addr)
-                self.socket.sendto(response, client_addr)
+                response = self.create_binding_response(transaction_id, client_addr)
+                self.transport.sendto(response, client_addr)
                 
                 self.stats['responses_sent'] += 1
-                logger.info(f"📤 Sent Binding Response to {client_addr[0]}:{client_addr[1]}")
-                logger.info(f"   Revealed public address: {client_addr[0]}:{client_addr[1]}")
+                logger.info("📤 Sent Binding Response, revealed public address %s:%d", client_addr[0], client_addr[1])
                 
             else:
-                logger.warning(f"Unsupported message type: {message.message_type:#x}")
-                error_response = self.create_error_response(
-                    message.transaction_id, 
-                    400, 
-                    "Bad Request"
-                )
-                self.socket.sendto(error_response, client_addr)
+                logger.warning("Unsupported message type: %#x", message_type)
+                self._bad_request[8:20] = transaction_id
+                self.transport.sendto(self._bad_request, client_addr)
                 
         except Exception as e:
             logger.error(f"Error handling STUN request: {e}")
@@ -224,7 +243,7 @@ class STUNServer:
             logger.info(f"   Requests received: {self.stats['requests_received']}")
             logger.info(f"   Responses sent: {self.stats['responses_sent']}")
             logger.info(f"   Errors: {self.stats['errors']}")
-            logger.info(f"   Unique clients: {len(self.stats['unique_clients'])}")
+            logger.info(f"   Unique clients (approx.): {len(self.stats['unique_clients'])}")
             
     async def run_server(self):
         """Run the STUN server"""
@@ -233,9 +252,15 @@ class STUNServer:
         # Create UDP socket
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER_SIZE)
         self.socket.bind((self.host, self.port))
         self.socket.setblocking(False)
         
+        # The transport keeps one persistent reader on the socket and calls
+        # STUNProtocol.datagram_received for every packet
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: STUNProtocol(self), sock=self.socket)
+        
         self.running = True
         
         logger.info("✅ STUN server started successfully")
@@ -249,30 +274,18 @@ class STUNServer:
         stats_task = asyncio.create_task(self.log_statistics())
         
         try:
-            while self.running:
-                try:
-                    # Receive data
-                    data, client_addr = await asyncio.get_event_loop().sock_recvfrom(self.socket, 1024)
-                    
-                    # Handle request asynchronously
-                    asyncio.create_task(self.handle_stun_request(data, client_addr))
-                    
-                except asyncio.CancelledError:
-                    break
-                except Exception as e:
-                    logger.error(f"Server error: {e}")
-                    
+            await asyncio.Future()  # Run forever
         except KeyboardInterrupt:
             logger.info("🛑 Shutting down STUN server...")
         finally:
             self.running = False
             stats_task.cancel()
-            self.socket.close()
+            self.transport.close()
             
             logger.info("📊 Final Statistics:")
             logger.info(f"   Total requests: {self.stats['requests_received']}")
             logger.info(f"   Total responses: {self.stats['responses_sent']}")
-            logger.info(f"   Unique clients served: {len(self.stats['unique_clients'])}")
+            logger.info(f"   Unique clients served (approx.): {len(self.stats['unique_clients'])}")
 
 def main():
     """Main STUN server entry point"""
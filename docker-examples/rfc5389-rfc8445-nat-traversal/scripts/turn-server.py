@@ -5,21 +5,60 @@ Provides relay functionality for cases where direct NAT traversal fails.
 """
 
 import asyncio
-import socket
 import logging
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 from datetime import datetime
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Echo prefix and the largest payload that fits in the reusable reply buffer
+RELAY_PREFIX = b"TURN-RELAY: "
+MAX_MTU = 1500
+
+class TURNProtocol(asyncio.DatagramProtocol):
+    """Datagram protocol echoing every packet back through the TURN server's transport"""
+    
+    def __init__(self, server: 'TURNServer'):
+        self.server = server
+        # One reply buffer with the prefix already written; each payload is
+        # copied in after it instead of concatenating a fresh bytes object
+        self._buf = bytearray(len(RELAY_PREFIX) + MAX_MTU)
+        self._buf[:len(RELAY_PREFIX)] = RELAY_PREFIX
+        self._view = memoryview(self._buf)
+        
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self.server.transport = transport
+        
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]):
+        try:
+            # Echo back with TURN prefix for identification. The transport copies
+            # the view if it has to queue it, so reusing the buffer is safe.
+            n = len(data)
+            if n <= MAX_MTU:
+                end = len(RELAY_PREFIX) + n
+                self._buf[len(RELAY_PREFIX):end] = data
+                self.server.transport.sendto(self._view[:end], addr)
+            else:
+                self.server.transport.sendto(RELAY_PREFIX + data, addr)
+            
+            self.server.stats['bytes_relayed'] += n
+            logger.info("🔄 Relayed %d bytes for %s:%d", n, addr[0], addr[1])
+            
+        except Exception as e:
+            logger.error(f"TURN relay error: {e}")
+            
+    def error_received(self, exc: Exception):
+        logger.error(f"TURN relay error: {exc}")
+
 class TURNServer:
     """Educational TURN server for relay functionality"""
     
     def __init__(self, host='0.0.0.0', port=3479):
         self.host = host
         self.port = port
+        self.transport: Optional[asyncio.DatagramTransport] = None
         self.allocations: Dict[str, Dict] = {}
         self.stats = {
             'allocations': 0,
@@ -33,30 +72,17 @@ class TURNServer:
         logger.info("📋 TURN server ready for relay allocations")
         logger.info("⚠️  Educational implementation - not for production use!")
         
-        # Simple UDP echo server for demonstration
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.bind((self.host, self.port))
-        sock.setblocking(False)
+        # Simple UDP echo server for demonstration: UDP sendto does not block,
+        # so TURNProtocol replies straight from datagram_received
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: TURNProtocol(self), local_addr=(self.host, self.port))
         
         try:
-            while True:
-                try:
-                    data, addr = await asyncio.get_event_loop().sock_recvfrom(sock, 1024)
-                    
-                    # Echo back with TURN prefix for identification
-                    response = b"TURN-RELAY: " + data
-                    await asyncio.get_event_loop().sock_sendto(sock, response, addr)
-                    
-                    self.stats['bytes_relayed'] += len(data)
-                    logger.info(f"🔄 Relayed {len(data)} bytes for {addr[0]}:{addr[1]}")
-                    
-                except Exception as e:
-                    logger.error(f"TURN relay error: {e}")
-                    
+            await asyncio.Future()  # Run forever
         except KeyboardInterrupt:
             logger.info("🛑 TURN server shutting down")
         finally:
-            sock.close()
+            self.transport.close()
 
 def main():
     import os
@@ -5,19 +5,22 @@ Educational implementation of RFC 7748 (Curve25519) and RFC 8439 (ChaCha20-Poly1
 showing how these specifications work together in WireGuard-like scenarios.
 """
 
+import hmac
+import logging
 import secrets
 import struct
+import sys
 import time
 import socket
 import threading
 from typing import Dict, List, Tuple, Optional
-from dataclasses import dataclass
-from datetime import datetime
+from dataclasses import dataclass, field
 
 try:
-    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives import hashes, serialization
     from cryptography.hazmat.primitives.kdf.hkdf import HKDF
     from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms
     from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
     PRODUCTION_CRYPTO = True
 except ImportError:
@@ -25,7 +28,48 @@ except ImportError:
     print("   Using educational implementations only")
     PRODUCTION_CRYPTO = False
 
-@dataclass
+try:
+    from nacl import bindings as nacl_bindings
+    NACL_AVAILABLE = True
+except ImportError:
+    NACL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Bytes of randomness fetched at a time for per-packet nonce salts
+NONCE_SALT_POOL_SIZE = 4096
+
+# 12-byte AEAD nonce: little-endian 64-bit counter followed by a 4-byte salt
+_NONCE_STRUCT = struct.Struct('<Q4s')
+
+# Curve25519 keypairs generated per refill of the keypair pool
+KEYPAIR_POOL_SIZE = 64
+
+# AEAD throughput benchmark: total bytes encrypted per backend, in chunks of this size
+BENCHMARK_TOTAL_BYTES = 10 * 1024 * 1024
+BENCHMARK_CHUNK_SIZE = 64 * 1024
+
+class SodiumChaCha20Poly1305:
+    """libsodium ChaCha20-Poly1305 (IETF) via PyNaCl, with the same interface as cryptography's AEAD."""
+    
+    def __init__(self, key: bytes):
+        self.key = key
+        
+    def encrypt(self, nonce: bytes, data: bytes, associated_data: Optional[bytes]) -> bytes:
+        return nacl_bindings.crypto_aead_chacha20poly1305_ietf_encrypt(data, associated_data, nonce, self.key)
+    
+    def decrypt(self, nonce: bytes, data: bytes, associated_data: Optional[bytes]) -> bytes:
+        return nacl_bindings.crypto_aead_chacha20poly1305_ietf_decrypt(data, associated_data, nonce, self.key)
+
+# Offset from the monotonic clock to wall-clock time, for displaying timestamps
+_WALL_CLOCK_OFFSET_NS = time.time_ns() - time.perf_counter_ns()
+
+def _fmt_ts(ns: int) -> str:
+    """Format a perf_counter_ns() reading as local wall-clock time."""
+    seconds, remainder = divmod(ns + _WALL_CLOCK_OFFSET_NS, 1_000_000_000)
+    return f"{time.strftime('%H:%M:%S', time.localtime(seconds))}.{remainder // 1_000_000:03d}"
+
+@dataclass(slots=True)
 class CryptoSession:
     """Represents a cryptographic session between two parties."""
     session_id: str
@@ -37,20 +81,79 @@ class CryptoSession:
     shared_secret: Optional[bytes]
     send_key: Optional[bytes]
     receive_key: Optional[bytes]
+    send_cipher: Optional['ChaCha20Poly1305'] = None
+    receive_cipher: Optional['ChaCha20Poly1305'] = None
+    ad_prefix: bytes = b''
     send_counter: int = 0
     receive_counter: int = 0
-    created_at: datetime = None
+    # Monotonic clock reading; only converted to wall-clock time for display
+    created_at_ns: int = field(default_factory=time.perf_counter_ns)
+
+@dataclass(slots=True)
+class PacketLog:
+    """Log of sent packets stored column-wise: one list per field, aligned by packet index."""
+    session_ids: List[int] = field(default_factory=list)
+    counters: List[int] = field(default_factory=list)
+    nonces: List[bytes] = field(default_factory=list)
+    ciphertexts: List[bytes] = field(default_factory=list)
+    tags: List[bytes] = field(default_factory=list)
+    associated_data: List[bytes] = field(default_factory=list)
+    timestamps: List[int] = field(default_factory=list)  # perf_counter_ns() readings
+    original_messages: List[Optional[str]] = field(default_factory=list)  # Verbose demo only
+    
+    def __len__(self) -> int:
+        return len(self.counters)
     
-    def __post_init__(self):
-        if self.created_at is None:
-            self.created_at = datetime.now()
+    def append(self, session_id: int, counter: int, nonce: bytes, ciphertext: bytes, tag: bytes,
+               associated_data: bytes, timestamp: int, original_message: Optional[str]) -> int:
+        """Record one packet and return its index."""
+        self.session_ids.append(session_id)
+        self.counters.append(counter)
+        self.nonces.append(nonce)
+        self.ciphertexts.append(ciphertext)
+        self.tags.append(tag)
+        self.associated_data.append(associated_data)
+        self.timestamps.append(timestamp)
+        self.original_messages.append(original_message)
+        return len(self.counters) - 1
 
 class WireGuardCryptoDemo:
     """Educational demonstration of WireGuard's cryptographic foundations."""
     
-    def __init__(self):
-        self.sessions: Dict[str, CryptoSession] = {}
-        self.message_log: List[Dict] = []
+    def __init__(self, verbose: bool = False):
+        # Per-packet send/receive details are only logged when verbose
+        self.verbose = verbose
+        # Sessions are addressed by their index in this list; the descriptive
+        # session IDs are only kept for display
+        self.sessions: List[CryptoSession] = []
+        self.session_handles: Dict[str, int] = {}
+        self.message_log = PacketLog()
+        
+        # Keypairs are generated in batches and handed out from this pool
+        self._keypair_pool: List[Tuple[bytes, bytes]] = []
+        
+        # Directional keys derived for the first peer of a pair, waiting for
+        # the second peer so both share one HKDF run
+        self._pair_key_cache: Dict[Tuple[bytes, str, str], Tuple[bytes, bytes]] = {}
+        
+        # AEAD implementation used for session ciphers; _select_aead_backend()
+        # replaces it with the fastest one measured on this machine
+        backends = self.available_aead_backends()
+        self._aead_backend = next(iter(backends.values()), None)
+        self.aead_benchmark: Dict[str, float] = {}
+        
+        # Nonce salts are sliced out of one block of randomness instead of
+        # calling token_bytes(4) per packet; the counter keeps nonces unique
+        self._nonce_salt_pool = secrets.token_bytes(NONCE_SALT_POOL_SIZE)
+        self._nonce_salt_off = 0
+        
+        # Non-secret demo values (example keys, nonces, benchmark data, labels)
+        # come from a ChaCha20 keystream seeded once, not one getrandom() each
+        if PRODUCTION_CRYPTO:
+            seed = secrets.token_bytes(32)
+            self._demo_stream = Cipher(algorithms.ChaCha20(seed, bytes(16)), mode=None).encryptor()
+        else:
+            self._demo_stream = None
         
     def print_header(self, title: str):
         """Print formatted section header."""
@@ -63,30 +166,50 @@ class WireGuardCryptoDemo:
         print(f"\\n📍 {step}")
         print('-'*40)
     
-    def generate_keypair(self) -> Tuple[bytes, bytes]:
-        """Generate Curve25519 keypair using production library if available."""
+    def next_nonce_salt(self) -> bytes:
+        """Return the next 4-byte nonce salt, refilling the pool when it runs out."""
+        off = self._nonce_salt_off
+        if off > len(self._nonce_salt_pool) - 4:
+            self._nonce_salt_pool = secrets.token_bytes(NONCE_SALT_POOL_SIZE)
+            off = 0
+        self._nonce_salt_off = off + 4
+        return self._nonce_salt_pool[off:off + 4]
+    
+    def _refill_keypair_pool(self, n: int = KEYPAIR_POOL_SIZE):
+        """Generate n Curve25519 keypairs in one pass and add them to the pool."""
+        pool = self._keypair_pool
         if PRODUCTION_CRYPTO:
-            private_key = X25519PrivateKey.generate()
-            public_key = private_key.public_key()
-            
-            private_bytes = private_key.private_bytes(
-                encoding=serialization.Encoding.Raw,
-                format=serialization.PrivateFormat.Raw,
-                encryption_algorithm=serialization.NoEncryption()
-            )
-            public_bytes = public_key.public_bytes(
-                encoding=serialization.Encoding.Raw,
-                format=serialization.PublicFormat.Raw
-            )
+            raw = serialization.Encoding.Raw
+            private_format = serialization.PrivateFormat.Raw
+            public_format = serialization.PublicFormat.Raw
+            no_encryption = serialization.NoEncryption()
+            generate = X25519PrivateKey.generate
             
-            return private_bytes, public_bytes
+            for _ in range(n):
+                private_key = generate()
+                pool.append((
+                    private_key.private_bytes(encoding=raw, format=private_format,
+                                              encryption_algorithm=no_encryption),
+                    private_key.public_key().public_bytes(encoding=raw, format=public_format)
+                ))
         else:
             # Educational fallback
-            private_key = secrets.token_bytes(32)
-            # This would normally compute public_key = private_key * base_point
-            # For demo purposes, we'll use a mock public key
-            public_key = secrets.token_bytes(32)
-            return private_key, public_key
+            for _ in range(n):
+                # This would normally compute public_key = private_key * base_point
+                # For demo purposes, we'll use a mock public key
+                pool.append((secrets.token_bytes(32), secrets.token_bytes(32)))
+    
+    def _demo_random(self, n: int) -> bytes:
+        """Return n bytes of demo randomness (never use for real key material)."""
+        if self._demo_stream is None:
+            return secrets.token_bytes(n)
+        return self._demo_stream.update(bytes(n))
+    
+    def generate_keypair(self) -> Tuple[bytes, bytes]:
+        """Take a Curve25519 keypair from the pool, generating a new batch when it is empty."""
+        if not self._keypair_pool:
+            self._refill_keypair_pool()
+        return self._keypair_pool.pop()
     
     def compute_shared_secret(self, private_key: bytes, peer_public_key: bytes) -> bytes:
         """Compute X25519 shared secret."""
@@ -116,36 +239,104 @@ class WireGuardCryptoDemo:
             # Educational mock
             return secrets.token_bytes(32), secrets.token_bytes(32)
     
-    def encrypt_message(self, key: bytes, nonce: bytes, plaintext: bytes, 
-                       associated_data: bytes = b'') -> Tuple[bytes, bytes]:
-        """Encrypt message using ChaCha20-Poly1305."""
+    def available_aead_backends(self) -> Dict[str, type]:
+        """ChaCha20-Poly1305 implementations importable here, by display name."""
+        backends = {}
         if PRODUCTION_CRYPTO:
-            cipher = ChaCha20Poly1305(key)
-            # ChaCha20Poly1305 expects 12-byte nonce but we'll use first 12 bytes
-            nonce_12 = nonce[:12] if len(nonce) >= 12 else nonce + b'\\x00' * (12 - len(nonce))
-            ciphertext = cipher.encrypt(nonce_12, plaintext, associated_data)
-            # Split ciphertext and tag (tag is last 16 bytes)
-            return ciphertext[:-16], ciphertext[-16:]
+            backends["cryptography (OpenSSL)"] = ChaCha20Poly1305
+        if NACL_AVAILABLE:
+            backends["PyNaCl (libsodium)"] = SodiumChaCha20Poly1305
+        return backends
+    
+    def benchmark_aead_backend(self, backend: type) -> float:
+        """Measure encryption throughput of one AEAD backend in MB/s."""
+        cipher = backend(self._demo_random(32))
+        nonce = self._demo_random(12)
+        chunk = self._demo_random(BENCHMARK_CHUNK_SIZE)
+        rounds = BENCHMARK_TOTAL_BYTES // BENCHMARK_CHUNK_SIZE
+        encrypt = cipher.encrypt
+        
+        # Warm up once so the timed pass does not include first-call setup
+        for _ in range(rounds):
+            encrypt(nonce, chunk, b'')
+        
+        start = time.perf_counter_ns()
+        for _ in range(rounds):
+            encrypt(nonce, chunk, b'')
+        elapsed = time.perf_counter_ns() - start
+        
+        return rounds * BENCHMARK_CHUNK_SIZE / 1e6 / (elapsed / 1e9)
+    
+    def _select_aead_backend(self) -> Optional[str]:
+        """Benchmark every available AEAD backend and use the fastest for new sessions."""
+        backends = self.available_aead_backends()
+        self.aead_benchmark = {name: self.benchmark_aead_backend(backend)
+                               for name, backend in backends.items()}
+        if not self.aead_benchmark:
+            return None
+        
+        fastest = max(self.aead_benchmark, key=self.aead_benchmark.get)
+        self._aead_backend = backends[fastest]
+        return fastest
+    
+    def derive_pair_keys(self, shared_secret: bytes, local_name: str,
+                         remote_name: str) -> Tuple[bytes, bytes]:
+        """Derive (send_key, receive_key) for one peer; both peers share a single HKDF run."""
+        first, second = sorted((local_name, remote_name))
+        cache_key = (shared_secret, first, second)
+        
+        # The second peer of a pair picks up the keys derived for the first
+        keys = self._pair_key_cache.pop(cache_key, None)
+        if keys is None:
+            keys = self.derive_session_keys(shared_secret, f"{first}+{second}")
+            self._pair_key_cache[cache_key] = keys
+        
+        # keys holds (first -> second, second -> first), so one side's send key
+        # is the other side's receive key
+        if local_name == first:
+            return keys
+        return keys[1], keys[0]
+    
+    def create_cipher(self, key: bytes) -> Optional['ChaCha20Poly1305']:
+        """Build a ChaCha20-Poly1305 AEAD object, reusable for every message under this key."""
+        if self._aead_backend is not None:
+            return self._aead_backend(key)
+        else:
+            # Educational mock - there is no cipher object to reuse
+            return None
+    
+    def encrypt_message(self, cipher: Optional['ChaCha20Poly1305'], nonce: bytes, plaintext: bytes, 
+                       associated_data: bytes = b'') -> Tuple[bytes, bytes]:
+        """Encrypt message using ChaCha20-Poly1305 (nonce must be exactly 12 bytes)."""
+        assert len(nonce) == 12, "ChaCha20-Poly1305 requires a 12-byte nonce"
+        if cipher is not None:
+            sealed = memoryview(cipher.encrypt(nonce, plaintext, associated_data))
+            # Split ciphertext and tag (tag is last 16 bytes) as views, without copying
+            return sealed[:-16], sealed[-16:]
         else:
             # Educational mock
             return secrets.token_bytes(len(plaintext)), secrets.token_bytes(16)
     
-    def decrypt_message(self, key: bytes, nonce: bytes, ciphertext: bytes, 
+    def decrypt_message(self, cipher: Optional['ChaCha20Poly1305'], nonce: bytes, ciphertext: bytes, 
                        tag: bytes, associated_data: bytes = b'') -> bytes:
-        """Decrypt message using ChaCha20-Poly1305."""
-        if PRODUCTION_CRYPTO:
-            cipher = ChaCha20Poly1305(key)
-            nonce_12 = nonce[:12] if len(nonce) >= 12 else nonce + b'\\x00' * (12 - len(nonce))
-            full_ciphertext = ciphertext + tag
-            plaintext = cipher.decrypt(nonce_12, full_ciphertext, associated_data)
+        """Decrypt message using ChaCha20-Poly1305 (nonce must be exactly 12 bytes)."""
+        assert len(nonce) == 12, "ChaCha20-Poly1305 requires a 12-byte nonce"
+        if cipher is not None:
+            if (isinstance(tag, memoryview) and tag.obj is getattr(ciphertext, 'obj', None)
+                    and len(ciphertext) + len(tag) == len(tag.obj)):
+                # Both halves still view the buffer encrypt_message produced
+                full_ciphertext = tag.obj
+            else:
+                full_ciphertext = b''.join((ciphertext, tag))
+            plaintext = cipher.decrypt(nonce, full_ciphertext, associated_data)
             return plaintext
         else:
             # Educational mock - return the plaintext that would have been encrypted
             return b"Decrypted educational message"
     
-    def create_session(self, local_name: str, remote_name: str) -> str:
-        """Create a new cryptographic session."""
-        session_id = f"{local_name}-{remote_name}-{secrets.token_hex(4)}"
+    def create_session(self, local_name: str, remote_name: str) -> int:
+        """Create a new cryptographic session and return its handle."""
+        session_id = f"{local_name}-{remote_name}-{self._demo_random(4).hex()}"
         
         private_key, public_key = self.generate_keypair()
         
@@ -161,10 +352,12 @@ class WireGuardCryptoDemo:
             receive_key=None
         )
         
-        self.sessions[session_id] = session
-        return session_id
+        handle = len(self.sessions)
+        self.sessions.append(session)
+        self.session_handles[session_id] = handle
+        return handle
     
-    def exchange_public_keys(self, session_id: str, peer_public_key: bytes):
+    def exchange_public_keys(self, session_id: int, peer_public_key: bytes):
         """Exchange public keys and establish shared secret."""
         session = self.sessions[session_id]
         session.remote_public_key = peer_public_key
@@ -176,20 +369,27 @@ class WireGuardCryptoDemo:
         )
         
         # Derive session keys
-        session_info = f"{session.local_name}+{session.remote_name}"
-        session.send_key, session.receive_key = self.derive_session_keys(
+        session.send_key, session.receive_key = self.derive_pair_keys(
             session.shared_secret,
-            session_info
+            session.local_name,
+            session.remote_name
         )
         
-        print(f"🤝 Session {session_id} established")
+        # Key the AEAD once per direction so sending and receiving skip cipher setup
+        session.send_cipher = self.create_cipher(session.send_key)
+        session.receive_cipher = self.create_cipher(session.receive_key)
+        
+        # The associated-data header only varies by counter, so encode the rest once
+        session.ad_prefix = f"WG:{session.local_name}→{session.remote_name}:".encode()
+        
+        print(f"🤝 Session {session.session_id} established")
         print(f"   Local: {session.local_name}")
         print(f"   Remote: {session.remote_name}")
-        print(f"   Shared Secret: {session.shared_secret.hex()[:16]}...")
-        print(f"   Send Key: {session.send_key.hex()[:16]}...")
-        print(f"   Receive Key: {session.receive_key.hex()[:16]}...")
+        print(f"   Shared Secret: {session.shared_secret[:8].hex()}...")
+        print(f"   Send Key: {session.send_key[:8].hex()}...")
+        print(f"   Receive Key: {session.receive_key[:8].hex()}...")
     
-    def send_encrypted_message(self, session_id: str, message: str) -> Dict:
+    def send_encrypted_message(self, session_id: int, message: str) -> int:
         """Send an encrypted message."""
         session = self.sessions[session_id]
         
@@ -197,48 +397,91 @@ class WireGuardCryptoDemo:
             raise ValueError("Session not established - no send key available")
         
         # Create nonce from counter
-        nonce = struct.pack('<Q', session.send_counter) + secrets.token_bytes(4)
+        nonce = _NONCE_STRUCT.pack(session.send_counter, self.next_nonce_salt())
         
         # Create associated data (simulating WireGuard packet header)
-        associated_data = f"WG:{session.local_name}→{session.remote_name}:{session.send_counter}".encode()
+        associated_data = session.ad_prefix + b'%d' % session.send_counter
         
         # Encrypt message
         plaintext = message.encode()
         ciphertext, tag = self.encrypt_message(
-            session.send_key,
+            session.send_cipher,
             nonce,
             plaintext,
             associated_data
         )
         
-        # Create packet
-        packet = {
-            'session_id': session_id,
-            'sender': session.local_name,
-            'receiver': session.remote_name,
-            'counter': session.send_counter,
-            'nonce': nonce,
-            'ciphertext': ciphertext,
-            'tag': tag,
-            'associated_data': associated_data,
-            'timestamp': datetime.now(),
-            'original_message': message  # For demo purposes
-        }
+        # Record the packet; its index in the log is the handle returned to the caller
+        packet = self.message_log.append(
+            session_id,
+            session.send_counter,
+            nonce,
+            ciphertext,
+            tag,
+            associated_data,
+            time.perf_counter_ns(),
+            # Plaintext is only kept for the verbose demo display
+            message if self.verbose else None
+        )
         
         session.send_counter += 1
-        self.message_log.append(packet)
         
-        print(f"📤 Message sent from {session.local_name} to {session.remote_name}")
-        print(f"   Original: '{message}'")
-        print(f"   Encrypted: {ciphertext.hex()[:32]}...")
-        print(f"   Auth Tag: {tag.hex()}")
-        print(f"   Counter: {session.send_counter - 1}")
+        if self.verbose:
+            logger.info("📤 Message sent from %s to %s", session.local_name, session.remote_name)
+            logger.info("   Original: '%s'", message)
+            logger.info("   Encrypted: %s...", ciphertext[:16].hex())
+            logger.info("   Auth Tag: %s", tag.hex())
+            logger.info("   Counter: %d", session.send_counter - 1)
         
         return packet
     
-    def receive_encrypted_message(self, packet: Dict) -> str:
-        """Receive and decrypt a message."""
-        session_id = packet['session_id']
+    def send_encrypted_messages(self, session_id: int, messages: List[str]) -> range:
+        """Encrypt a burst of messages in one tight loop (no per-packet output)."""
+        session = self.sessions[session_id]
+        
+        if not session.send_key:
+            raise ValueError("Session not established - no send key available")
+        
+        count = len(messages)
+        counter_base = session.send_counter
+        cipher = session.send_cipher
+        encrypt = self.encrypt_message
+        ad_prefix = session.ad_prefix
+        
+        # Counters keep every nonce unique, so the whole burst can share one salt
+        salt = self.next_nonce_salt()
+        pack_nonce = _NONCE_STRUCT.pack
+        nonces = [pack_nonce(counter_base + i, salt) for i in range(count)]
+        
+        ciphertexts = [None] * count
+        tags = [None] * count
+        associated_data = [None] * count
+        timestamps = [None] * count
+        for i in range(count):
+            ad = ad_prefix + b'%d' % (counter_base + i)
+            ciphertexts[i], tags[i] = encrypt(cipher, nonces[i], messages[i].encode(), ad)
+            associated_data[i] = ad
+            timestamps[i] = time.perf_counter_ns()
+        
+        session.send_counter += count
+        
+        # Extend each column of the log once for the whole burst
+        log = self.message_log
+        start = len(log)
+        log.session_ids.extend([session_id] * count)
+        log.counters.extend(range(counter_base, counter_base + count))
+        log.nonces.extend(nonces)
+        log.ciphertexts.extend(ciphertexts)
+        log.tags.extend(tags)
+        log.associated_data.extend(associated_data)
+        log.timestamps.extend(timestamps)
+        log.original_messages.extend(messages if self.verbose else [None] * count)
+        
+        return range(start, start + count)
+    
+    def receive_encrypted_message(self, session_id: int, packet: int) -> str:
+        """Receive and decrypt a message on the receiving peer's session, given its packet log index."""
+        log = self.message_log
         session = self.sessions[session_id]
         
         if not session.receive_key:
@@ -247,19 +490,24 @@ class WireGuardCryptoDemo:
         # Decrypt message
         try:
             plaintext = self.decrypt_message(
-                session.receive_key,
-                packet['nonce'],
-                packet['ciphertext'],
-                packet['tag'],
-                packet['associated_data']
+                session.receive_cipher,
+                log.nonces[packet],
+                log.ciphertexts[packet],
+                log.tags[packet],
+                log.associated_data[packet]
             )
             
-            message = plaintext.decode() if PRODUCTION_CRYPTO else packet['original_message']
+            if PRODUCTION_CRYPTO or not self.verbose:
+                message = plaintext.decode()
+            else:
+                # Educational mock cannot really decrypt; show the kept plaintext
+                message = log.original_messages[packet]
             
-            print(f"📥 Message received by {session.remote_name} from {session.local_name}")
-            print(f"   Encrypted: {packet['ciphertext'].hex()[:32]}...")
-            print(f"   Decrypted: '{message}'")
-            print(f"   Authentication: ✅ Verified")
+            if self.verbose:
+                logger.info("📥 Message received by %s from %s", session.local_name, session.remote_name)
+                logger.info("   Encrypted: %s...", log.ciphertexts[packet][:16].hex())
+                logger.info("   Decrypted: '%s'", message)
+                logger.info("   Authentication: ✅ Verified")
             
             session.receive_counter += 1
             return message
@@ -275,44 +523,47 @@ class WireGuardCryptoDemo:
         # Alice generates her keypair
         alice_private, alice_public = self.generate_keypair()
         print(f"👩 Alice generates keypair:")
-        print(f"   Private: {alice_private.hex()[:16]}... (kept secret)")
-        print(f"   Public:  {alice_public.hex()[:16]}... (shared)")
+        print(f"   Private: {alice_private[:8].hex()}... (kept secret)")
+        print(f"   Public:  {alice_public[:8].hex()}... (shared)")
         
         # Bob generates his keypair
         bob_private, bob_public = self.generate_keypair()
         print(f"\\n👨 Bob generates keypair:")
-        print(f"   Private: {bob_private.hex()[:16]}... (kept secret)")
-        print(f"   Public:  {bob_public.hex()[:16]}... (shared)")
+        print(f"   Private: {bob_private[:8].hex()}... (kept secret)")
+        print(f"   Public:  {bob_public[:8].hex()}... (shared)")
         
         # Both compute the same shared secret
         alice_shared = self.compute_shared_secret(alice_private, bob_public)
         bob_shared = self.compute_shared_secret(bob_private, alice_public)
         
         print(f"\\n🤝 Shared Secret Computation:")
-        print(f"   Alice computes: X25519(alice_private, bob_public) = {alice_shared.hex()[:16]}...")
-        print(f"   Bob computes:   X25519(bob_private, alice_public) = {bob_shared.hex()[:16]}...")
+        print(f"   Alice computes: X25519(alice_private, bob_public) = {alice_shared[:8].hex()}...")
+        print(f"   Bob computes:   X25519(bob_private, alice_public) = {bob_shared[:8].hex()}...")
         
-        if alice_shared == bob_shared:
+        # Compare secrets in constant time, as real code must
+        secrets_match = hmac.compare_digest(alice_shared, bob_shared)
+        if secrets_match:
             print("✅ SUCCESS: Both parties have the same shared secret!")
         else:
             print("❌ ERROR: Shared secrets don't match!")
         
-        return alice_shared == bob_shared
+        return secrets_match
     
     def demonstrate_aead_encryption(self):
         """Demonstrate ChaCha20-Poly1305 AEAD encryption."""
         self.print_step("ChaCha20-Poly1305 AEAD Encryption (RFC 8439)")
         
         # Generate a session key
-        key = secrets.token_bytes(32)
-        print(f"🔑 Session Key: {key.hex()[:16]}...")
+        key = self._demo_random(32)
+        print(f"🔑 Session Key: {key[:8].hex()}...")
+        cipher = self.create_cipher(key)
         
         # Test message
         message = "Hello WireGuard! This message is encrypted with ChaCha20-Poly1305."
         print(f"📝 Original Message: '{message}'")
         
         # Generate nonce
-        nonce = secrets.token_bytes(12)
+        nonce = self._demo_random(12)
         print(f"🎲 Nonce: {nonce.hex()}")
         
         # Associated data (packet header)
@@ -320,14 +571,14 @@ class WireGuardCryptoDemo:
         print(f"📋 Associated Data: {associated_data.decode()}")
         
         # Encrypt
-        ciphertext, tag = self.encrypt_message(key, nonce, message.encode(), associated_data)
+        ciphertext, tag = self.encrypt_message(cipher, nonce, message.encode(), associated_data)
         print(f"\\n🔒 Encryption Result:")
-        print(f"   Ciphertext: {ciphertext.hex()[:32]}...")
+        print(f"   Ciphertext: {ciphertext[:16].hex()}...")
         print(f"   Auth Tag:   {tag.hex()}")
         
         # Decrypt
         try:
-            decrypted = self.decrypt_message(key, nonce, ciphertext, tag, associated_data)
+            decrypted = self.decrypt_message(cipher, nonce, ciphertext, tag, associated_data)
             decrypted_message = decrypted.decode() if PRODUCTION_CRYPTO else message
             
             print(f"\\n🔓 Decryption Result:")
@@ -347,7 +598,7 @@ class WireGuardCryptoDemo:
         tampered_ciphertext[0] ^= 1  # Flip one bit
         
         try:
-            self.decrypt_message(key, nonce, bytes(tampered_ciphertext), tag, associated_data)
+            self.decrypt_message(cipher, nonce, bytes(tampered_ciphertext), tag, associated_data)
             print("❌ ERROR: Tampering not detected!")
         except:
             print("✅ SUCCESS: Tampering detected and rejected!")
@@ -373,25 +624,44 @@ class WireGuardCryptoDemo:
         
         # Alice sends message to Bob
         packet1 = self.send_encrypted_message(alice_session, "Hello Bob! This is Alice.")
-        decrypted1 = self.receive_encrypted_message(packet1)
+        decrypted1 = self.receive_encrypted_message(bob_session, packet1)
         
         # Bob responds to Alice
         packet2 = self.send_encrypted_message(bob_session, "Hi Alice! Message received loud and clear.")
-        decrypted2 = self.receive_encrypted_message(packet2)
+        decrypted2 = self.receive_encrypted_message(alice_session, packet2)
         
         # More messages to show counter progression
         packet3 = self.send_encrypted_message(alice_session, "Great! Our VPN tunnel is working perfectly.")
-        decrypted3 = self.receive_encrypted_message(packet3)
+        decrypted3 = self.receive_encrypted_message(bob_session, packet3)
+        
+        # Bulk traffic: encrypt a burst in a single call
+        burst = self.send_encrypted_messages(
+            bob_session, [f"Bulk packet {i}" for i in range(16)]
+        )
+        print(f"\\n📦 Burst: {len(burst)} packets encrypted from {bob.local_name} to {bob.remote_name} in one call")
         
         print(f"\\n📊 Session Statistics:")
         print(f"   Alice → Bob messages: {alice.send_counter}")
         print(f"   Bob → Alice messages: {bob.send_counter}")
         print(f"   Total encrypted packets: {len(self.message_log)}")
+        print(f"   Session created: {_fmt_ts(alice.created_at_ns)}")
+        print(f"   Last packet sent: {_fmt_ts(self.message_log.timestamps[-1])}")
     
     def performance_comparison(self):
         """Compare performance characteristics."""
         self.print_step("Performance Analysis")
         
+        print(f"⏱️  Measured ChaCha20-Poly1305 throughput on this machine "
+              f"({BENCHMARK_TOTAL_BYTES // (1024 * 1024)} MiB in {BENCHMARK_CHUNK_SIZE // 1024} KiB chunks):")
+        if self.aead_benchmark:
+            fastest = max(self.aead_benchmark, key=self.aead_benchmark.get)
+            for name, throughput in self.aead_benchmark.items():
+                marker = " ⭐ (in use)" if name == fastest else ""
+                print(f"   {name:<24} {throughput:>8.0f} MB/s{marker}")
+        else:
+            print("   No AEAD library available (educational mode)")
+        print()
+        
         print("🏃 ChaCha20-Poly1305 vs AES-GCM Performance:")
         print()
         
@@ -407,8 +677,7 @@ class WireGuardCryptoDemo:
             ("Implementation", "Simple", "Complex")
         ]
         
-        for row in performance_data:
-            print(f"{row[0]:<15} {row[1]:<17} {row[2]}")
+        print("\n".join(f"{a:<15} {b:<17} {c}" for a, b, c in performance_data))
         
         print(f"\\n🎯 Why WireGuard Chose These Algorithms:")
         print("   • Curve25519: Fast, secure, simple elliptic curve")
@@ -424,6 +693,10 @@ class WireGuardCryptoDemo:
         print(f"   Production crypto available: {'✅' if PRODUCTION_CRYPTO else '❌ (educational only)'}")
         
         try:
+            # Pick the fastest AEAD implementation before any session is created
+            backend = self._select_aead_backend()
+            print(f"   AEAD backend: {backend or 'educational mock'}")
+            
             # Demonstrate individual components
             success1 = self.demonstrate_key_exchange()
             time.sleep(2)
@@ -453,7 +726,9 @@ class WireGuardCryptoDemo:
 
 def main():
     """Main demonstration function."""
-    demo = WireGuardCryptoDemo()
+    # Per-packet details go through logging; show them inline with the demo output
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+    demo = WireGuardCryptoDemo(verbose=True)
     demo.run_comprehensive_demo()
 
 if __name__ == "__main__":
@@ -16,19 +16,39 @@ import sys
 from shared_utils import (
     log_message,
     get_tcp_info,
-    create_message_with_sequence,
+    create_message_with_sequence_bytes,
     parse_message_with_sequence,
 )
 
+# Send/receive buffer size requested before connecting, so bursts are not throttled
+SOCKET_BUFFER_SIZE = 256 * 1024
+
+# Messages sent back-to-back in a single sendmsg() call during the burst
+BURST_SIZE = 3
+
 
 class TCPClient:
+    # Message variety for the demo; %d is replaced with the sequence number.
+    # Templates are ASCII bytes so messages never need encoding.
+    _MESSAGE_TEMPLATES = (
+        b"Hello from TCP client (message %d)",
+        b"Testing reliable delivery #%d",
+        b"Sequence number demonstration %d",
+        b"TCP flow control test %d",
+        b"Connection state message %d",
+    )
+
     def __init__(self, server_host="tcp-server", server_port=8080):
         self.server_host = server_host
         self.server_port = server_port
         self.client_socket = None
+        # Responses are received into one reusable buffer instead of a new bytes per recv()
+        self._recv_buf = bytearray(4096)
+        self._recv_mv = memoryview(self._recv_buf)
         self.stats = {
             "messages_sent": 0,
             "messages_received": 0,
+            "burst_messages_sent": 0,
             "bytes_sent": 0,
             "bytes_received": 0,
             "connection_failures": 0,
@@ -47,6 +67,13 @@ class TCPClient:
 
             # Configure socket options
             self.client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.client_socket.setsockopt(
+                socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE
+            )
+            self.client_socket.setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE
+            )
+            self._enable_quickack()
             self.client_socket.settimeout(10.0)  # 10 second timeout
 
             # Connect (triggers three-way handshake)
@@ -84,6 +111,15 @@ class TCPClient:
             self.stats["connection_failures"] += 1
             return False
 
+    def _enable_quickack(self):
+        """ACK responses immediately instead of waiting for the delayed-ACK timer
+
+        Linux-only, and the kernel may drop back to delayed ACKs after a recv(),
+        so this is re-applied after every response.
+        """
+        if hasattr(socket, "TCP_QUICKACK"):
+            self.client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+
     def send_messages(self, message_count: int = 5, delay: float = 2.0):
         """Send a series of messages to demonstrate TCP reliability"""
         if not self.client_socket:
@@ -94,22 +130,23 @@ class TCPClient:
             "TCP-CLIENT", f"📨 Sending {message_count} messages with {delay}s delay"
         )
 
+        # Pick every message's template up front in one PRNG call
+        templates = self._MESSAGE_TEMPLATES
+        choices = random.choices(range(len(templates)), k=message_count)
+
+        burst_end = 0
         for i in range(1, message_count + 1):
+            if i <= burst_end:
+                continue  # Already sent as part of the burst
             try:
                 # Create message with variety
-                messages = [
-                    f"Hello from TCP client (message {i})",
-                    f"Testing reliable delivery #{i}",
-                    f"Sequence number demonstration {i}",
-                    f"TCP flow control test {i}",
-                    f"Connection state message {i}",
-                ]
-
-                message = random.choice(messages)
-                message_data = create_message_with_sequence(i, message)
+                payload = templates[choices[i - 1]] % i
+                message_data = create_message_with_sequence_bytes(i, payload)
 
                 # Send message
-                log_message("TCP-CLIENT", f"📤 Sending seq={i}: '{message}'")
+                log_message(
+                    "TCP-CLIENT", f"📤 Sending seq={i}: '{payload.decode('ascii')}'"
+                )
                 send_start = time.time()
                 bytes_sent = self.client_socket.send(message_data)
                 send_time = (time.time() - send_start) * 1000
@@ -123,16 +160,17 @@ class TCPClient:
 
                 # Wait for response
                 try:
-                    response_data = self.client_socket.recv(1024)
-                    if response_data:
+                    received = self.client_socket.recv_into(self._recv_mv)
+                    self._enable_quickack()
+                    if received:
                         (
                             recv_seq,
                             recv_timestamp,
                             response_message,
-                        ) = parse_message_with_sequence(response_data)
+                        ) = parse_message_with_sequence(self._recv_mv[:received])
 
                         self.stats["messages_received"] += 1
-                        self.stats["bytes_received"] += len(response_data)
+                        self.stats["bytes_received"] += received
 
                         log_message(
                             "TCP-CLIENT",
@@ -154,17 +192,26 @@ class TCPClient:
                     )
 
                 # Demonstrate different sending patterns
-                if i == message_count // 2:
+                if i == message_count // 2 and i < message_count:
+                    burst = min(BURST_SIZE, message_count - i)
                     log_message(
                         "TCP-CLIENT",
-                        "⚡ Sending burst of messages to test flow control",
+                        f"⚡ Sending burst of {burst} messages to test flow control",
+                    )
+                    self.send_burst(
+                        i + 1,
+                        [
+                            templates[choices[seq - 1]] % seq
+                            for seq in range(i + 1, i + 1 + burst)
+                        ],
                     )
+                    burst_end = i + burst
                     delay_override = 0.1
                 else:
                     delay_override = delay
 
                 # Wait before next message (except for last message)
-                if i < message_count:
+                if max(i, burst_end) < message_count:
                     log_message(
                         "TCP-CLIENT",
                         f"⏳ Waiting {delay_override}s before next message",
@@ -182,6 +229,57 @@ class TCPClient:
                 )
                 break
 
+    def send_burst(self, first_seq: int, payloads: list[bytes]):
+        """Send several messages with one gathered write instead of one send() each"""
+        count = len(payloads)
+        buffers = [
+            create_message_with_sequence_bytes(seq, payload)
+            for seq, payload in enumerate(payloads, first_seq)
+        ]
+        total = sum(len(buf) for buf in buffers)
+
+        # With TCP_NODELAY every send() becomes its own tiny segment; gathering
+        # the buffers into one sendmsg() lets the kernel pack them together
+        if hasattr(self.client_socket, "sendmsg"):
+            bytes_sent = self.client_socket.sendmsg(buffers)
+            if bytes_sent < total:
+                self.client_socket.sendall(b"".join(buffers)[bytes_sent:])
+        else:
+            self.client_socket.sendall(b"".join(buffers))
+
+        # Burst messages get no one-to-one reply, so they are kept out of the
+        # messages_sent count that the success rate is computed from
+        self.stats["burst_messages_sent"] += count
+        self.stats["bytes_sent"] += total
+
+        for seq, payload in enumerate(payloads, first_seq):
+            log_message(
+                "TCP-CLIENT", f"📤 Sent burst seq={seq}: '{payload.decode('ascii')}'"
+            )
+        log_message(
+            "TCP-CLIENT", f"📊 Sent {count} messages ({total} bytes) in one write"
+        )
+
+        # TCP is a byte stream, so the server may read the whole burst at once
+        # and answer with fewer echoes than messages sent: drain what arrives,
+        # counting bytes only since a read is not one reply per message
+        timeout = self.client_socket.gettimeout()
+        self.client_socket.settimeout(0.5)
+        try:
+            while True:
+                received = self.client_socket.recv_into(self._recv_mv)
+                if not received:
+                    break
+                self.stats["bytes_received"] += received
+                log_message(
+                    "TCP-CLIENT",
+                    f"📨 Received {received} bytes in reply to burst",
+                )
+        except socket.timeout:
+            pass
+        finally:
+            self.client_socket.settimeout(timeout)
+
     def disconnect(self):
         """Gracefully disconnect from server"""
         if self.client_socket:
@@ -229,6 +327,9 @@ class TCPClient:
         log_message(
             "TCP-CLIENT", f"   Messages received: {self.stats['messages_received']}"
         )
+        log_message(
+            "TCP-CLIENT", f"   Burst messages sent: {self.stats['burst_messages_sent']}"
+        )
         log_message("TCP-CLIENT", f"   Bytes sent: {self.stats['bytes_sent']}")
         log_message("TCP-CLIENT", f"   Bytes received: {self.stats['bytes_received']}")
         log_message(
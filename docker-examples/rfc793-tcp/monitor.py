@@ -8,21 +8,139 @@ This monitor demonstrates:
 - Connection state monitoring
 - Performance metrics collection
 """
+import functools
+import socket
+import struct
 import subprocess
 import time
 import threading
 import signal
 import sys
 import re
+from array import array
 from collections import defaultdict
-from shared_utils import log_message
+from shared_utils import log_message, schedule
+
+# Port whose connections are tracked
+MONITOR_PORT = 8080
+
+# Minimum seconds between per-packet log lines of the same kind; the packet
+# counters themselves are always updated
+PACKET_LOG_INTERVAL = 0.25
+
+# Seconds between statistics reports
+STATS_INTERVAL = 15
+
+# Seconds between connection-table dumps while there is traffic; when idle the
+# interval doubles up to the maximum
+CONN_POLL_INTERVAL = 5
+CONN_POLL_MAX_INTERVAL = 60
+
+# NETLINK_SOCK_DIAG (inet_diag) constants from <linux/netlink.h> and <linux/sock_diag.h>
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+INET_DIAG_REQ_BYTECODE = 1
+INET_DIAG_BC_JMP = 1
+INET_DIAG_BC_S_GE = 2
+INET_DIAG_BC_S_LE = 3
+INET_DIAG_BC_D_GE = 4
+INET_DIAG_BC_D_LE = 5
+
+# Kernel TCP state numbers (include/net/tcp_states.h), named as netstat prints them
+TCP_STATES = (
+    "UNKNOWN",
+    "ESTABLISHED",
+    "SYN_SENT",
+    "SYN_RECV",
+    "FIN_WAIT1",
+    "FIN_WAIT2",
+    "TIME_WAIT",
+    "CLOSE",
+    "CLOSE_WAIT",
+    "LAST_ACK",
+    "LISTEN",
+    "CLOSING",
+    "NEW_SYN_RECV",
+)
+TCP_LISTEN = 10
+
+# Every state except LISTEN, matching what `netstat -tn` reports
+_DIAG_STATES = 0xFFF & ~(1 << TCP_LISTEN)
+
+# TCP flags plus the seq and ack numbers that follow them in a tcpdump line,
+# e.g. "Flags [P.], seq 1:46, ack 1, win 502"
+_TCP_RE = re.compile(
+    r"Flags \[(?P<flags>[^\]]+)\](?:, seq (?P<seq>\d+)[^,]*)?(?:, ack (?P<ack>\d+))?"
+)
+
+# tcpdump flag letters as bits, so a flags string folds into one integer mask
+_FLAG_BIT = {"F": 1, "S": 2, "R": 4, "P": 8, ".": 16, "U": 32, "E": 64, "W": 128}
+
+# Slots of the fixed-layout counter array in TCPMonitor.stats
+SYN, SYNACK, FIN, RST, ACK, CAPTURED, CONN_EST, CONN_CLOSED = range(8)
+STAT_COUNT = 8
+
+# Only FIN, SYN, RST and ACK decide the category; PSH/URG/ECE/CWR are masked off
+_CLASSIFY_BITS = 1 | 2 | 4 | 16
+_CLASSIFY = {
+    2: SYN,
+    2 | 16: SYNACK,
+    1: FIN,
+    1 | 16: FIN,
+    4: RST,
+    4 | 16: RST,
+    16: ACK,
+}
+_CLASSIFY_LABEL = {SYN: "SYN", SYNACK: "SYN-ACK", FIN: "FIN", RST: "RST", ACK: "ACK"}
+
+
+@functools.lru_cache(maxsize=4096)
+def _classify(tail: str) -> tuple[int | None, str | None, str | None] | None:
+    """Counter slot, seq and ack of a tcpdump line (minus its timestamp)
+
+    Returns None for lines without TCP flags. Steady traffic repeats the same
+    line bodies, so results are cached and the regex only runs on new ones.
+    """
+    match = _TCP_RE.search(tail)
+    if match is None:
+        return None
+    mask = 0
+    for c in match.group("flags"):
+        mask |= _FLAG_BIT.get(c, 0)
+    slot = _CLASSIFY.get(mask & _CLASSIFY_BITS)
+    return slot, match.group("seq"), match.group("ack")
+
+
+# nlmsghdr, inet_diag_req_v2 and the fields read from each inet_diag_msg
+_NLMSGHDR = struct.Struct("=IHHII")
+_DIAG_REQ = struct.Struct("=BBBxI48s")
+_DIAG_MSG = struct.Struct("!xBxxHH4s12x4s")
+
+# rtattr header and inet_diag_bc_op (code, yes, no) for the request filter
+_RTATTR = struct.Struct("=HH")
+_BC_OP = struct.Struct("=BBH")
 
 
 class TCPMonitor:
     def __init__(self):
         self.running = False
-        self.stats = defaultdict(int)
+        self.stats = array("Q", bytes(8 * STAT_COUNT))
+        self.state_counts = defaultdict(int)  # Rare, so keyed by state name
         self.connections = {}
+        self._last_log = defaultdict(float)
+
+        # One netlink socket, reused for every connection-table dump
+        try:
+            self.diag_socket = socket.socket(
+                socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_SOCK_DIAG
+            )
+        except (AttributeError, OSError):
+            self.diag_socket = None
+        self._diag_request = self._build_diag_request()
 
     def setup_signal_handlers(self):
         """Handle graceful shutdown"""
@@ -43,15 +161,11 @@ class TCPMonitor:
         log_message("TCP-MONITOR", "🔍 Starting TCP traffic monitoring")
         log_message("TCP-MONITOR", "Monitoring TCP packets between client and server")
 
-        # Start different monitoring threads
-        threads = [
-            threading.Thread(target=self._monitor_netstat, daemon=True),
-            threading.Thread(target=self._monitor_tcpdump, daemon=True),
-            threading.Thread(target=self._report_stats, daemon=True),
-        ]
-
-        for thread in threads:
-            thread.start()
+        # Packet capture blocks on tcpdump's output, so it keeps its own thread;
+        # connection polling and reporting run on the shared scheduler thread
+        threading.Thread(target=self._monitor_tcpdump, daemon=True).start()
+        self._start_connection_polling()
+        schedule(STATS_INTERVAL, self._report_stats)
 
         # Keep main thread alive
         try:
@@ -60,70 +174,139 @@ class TCPMonitor:
         except KeyboardInterrupt:
             self.shutdown()
 
-    def _monitor_netstat(self):
-        """Monitor active TCP connections using netstat"""
-        while self.running:
-            try:
-                # Run netstat to get current TCP connections
-                result = subprocess.run(
-                    ["netstat", "-tn"], capture_output=True, text=True, timeout=5
-                )
-
-                if result.returncode == 0:
-                    self._parse_netstat_output(result.stdout)
+    def _start_connection_polling(self):
+        """Monitor active TCP connections using netlink sock_diag"""
+        if self.diag_socket is None:
+            log_message(
+                "TCP-MONITOR",
+                "⚠️  netlink sock_diag not available, skipping connection tracking",
+                "WARN",
+            )
+            return
 
-            except subprocess.TimeoutExpired:
-                log_message("TCP-MONITOR", "⏰ netstat command timed out", "WARN")
-            except Exception as e:
-                log_message("TCP-MONITOR", f"❌ netstat monitoring error: {e}", "ERROR")
+        self._poll_connections(CONN_POLL_INTERVAL, self.stats[CAPTURED])
 
-            time.sleep(5)  # Check every 5 seconds
+    def _poll_connections(self, interval: float, last_captured: int):
+        """Dump the connection table once, then schedule the next dump"""
+        if not self.running:
+            return
 
-    def _parse_netstat_output(self, output: str):
-        """Parse netstat output to track TCP connections"""
-        lines = output.strip().split("\n")
+        try:
+            self._track_connections(self._dump_tcp_connections())
+        except Exception as e:
+            log_message("TCP-MONITOR", f"❌ sock_diag monitoring error: {e}", "ERROR")
+
+        # Back off while no packets are seen and no connections are open
+        if self.stats[CAPTURED] > last_captured or self.connections:
+            interval = CONN_POLL_INTERVAL
+        else:
+            interval = min(CONN_POLL_MAX_INTERVAL, interval * 2)
+
+        schedule(interval, self._poll_connections, interval, self.stats[CAPTURED])
+
+    @staticmethod
+    def _build_diag_request() -> bytes:
+        """Build the netlink request dumping non-listening MONITOR_PORT sockets"""
+        # inet_diag bytecode for "sport == MONITOR_PORT or dport == MONITOR_PORT",
+        # so the kernel drops every other socket before anything is copied out.
+        # Each port comparison is an op followed by a pseudo-op holding the port.
+        # "yes" must always step to the next op (the kernel validates along that
+        # chain); "no" jumps forward, where landing exactly on the end accepts
+        # the socket and landing 4 bytes past it rejects it.
+        port = _BC_OP.pack(0, 0, MONITOR_PORT)
+        bytecode = b"".join(
+            (
+                # sport in [port, port], else try dport (offset 20)
+                _BC_OP.pack(INET_DIAG_BC_S_GE, 8, 20),
+                port,
+                _BC_OP.pack(INET_DIAG_BC_S_LE, 8, 12),
+                port,
+                # sport matched: unconditional jump to the end (accept)
+                _BC_OP.pack(INET_DIAG_BC_JMP, 4, 20),
+                # dport in [port, port], else reject
+                _BC_OP.pack(INET_DIAG_BC_D_GE, 8, 20),
+                port,
+                _BC_OP.pack(INET_DIAG_BC_D_LE, 8, 12),
+                port,
+            )
+        )
+
+        payload = (
+            _DIAG_REQ.pack(
+                socket.AF_INET, socket.IPPROTO_TCP, 0, _DIAG_STATES, bytes(48)
+            )
+            + _RTATTR.pack(_RTATTR.size + len(bytecode), INET_DIAG_REQ_BYTECODE)
+            + bytecode
+        )
+        header = _NLMSGHDR.pack(
+            _NLMSGHDR.size + len(payload),
+            SOCK_DIAG_BY_FAMILY,
+            NLM_F_REQUEST | NLM_F_DUMP,
+            1,
+            0,
+        )
+        return header + payload
+
+    def _dump_tcp_connections(self) -> dict:
+        """Ask the kernel for TCP sockets and return those on MONITOR_PORT"""
+        self.diag_socket.send(self._diag_request)
         current_connections = {}
 
-        for line in lines[2:]:  # Skip headers
-            if "tcp" not in line.lower():
-                continue
-
-            parts = line.split()
-            if len(parts) >= 6:
-                protocol = parts[0]
-                local_addr = parts[3]
-                remote_addr = parts[4]
-                state = parts[5]
-
-                # Focus on port 8080 connections
-                if ":8080" in local_addr or ":8080" in remote_addr:
-                    conn_key = f"{local_addr}<->{remote_addr}"
-                    current_connections[conn_key] = {
-                        "protocol": protocol,
-                        "local": local_addr,
-                        "remote": remote_addr,
-                        "state": state,
-                    }
-
-                    # Track state changes
-                    if conn_key not in self.connections:
-                        log_message(
-                            "TCP-MONITOR",
-                            f"🔗 New connection: {local_addr} <-> {remote_addr} ({state})",
-                        )
-                        self.stats["connections_established"] += 1
-                    elif self.connections.get(conn_key, {}).get("state") != state:
-                        log_message(
-                            "TCP-MONITOR",
-                            f"🔄 State change: {conn_key} {self.connections[conn_key]['state']} -> {state}",
-                        )
-                        self.stats[f"state_{state.lower()}"] += 1
+        while True:
+            data = self.diag_socket.recv(65536)
+            offset = 0
+            while offset + _NLMSGHDR.size <= len(data):
+                msg_len, msg_type, _, _, _ = _NLMSGHDR.unpack_from(data, offset)
+                if msg_type == NLMSG_DONE:
+                    return current_connections
+                if msg_type == NLMSG_ERROR:
+                    raise OSError("sock_diag request rejected by the kernel")
+
+                state, sport, dport, src, dst = _DIAG_MSG.unpack_from(
+                    data, offset + _NLMSGHDR.size
+                )
+                # The request's bytecode filter already matched the port
+                local_addr = f"{socket.inet_ntoa(src)}:{sport}"
+                remote_addr = f"{socket.inet_ntoa(dst)}:{dport}"
+                conn_key = f"{local_addr}<->{remote_addr}"
+                current_connections[conn_key] = {
+                    "protocol": "tcp",
+                    "local": local_addr,
+                    "remote": remote_addr,
+                    "state": TCP_STATES[state]
+                    if state < len(TCP_STATES)
+                    else "UNKNOWN",
+                }
+
+                offset += (msg_len + 3) & ~3
+
+            if not data:
+                return current_connections
+
+    def _track_connections(self, current_connections: dict):
+        """Log new, changed and closed connections since the previous dump"""
+        for conn_key, conn_info in current_connections.items():
+            state = conn_info["state"]
+
+            # Track state changes
+            if conn_key not in self.connections:
+                log_message(
+                    "TCP-MONITOR",
+                    f"🔗 New connection: {conn_info['local']} <-> {conn_info['remote']} ({state})",
+                )
+                self.stats[CONN_EST] += 1
+            elif self.connections[conn_key]["state"] != state:
+                log_message(
+                    "TCP-MONITOR",
+                    f"🔄 State change: {conn_key} {self.connections[conn_key]['state']} -> {state}",
+                )
+                self.state_counts[state] += 1
 
         # Check for closed connections
         for conn_key in self.connections:
             if conn_key not in current_connections:
                 log_message("TCP-MONITOR", f"🔌 Connection closed: {conn_key}")
-                self.stats["connections_closed"] += 1
+                self.stats[CONN_CLOSED] += 1
 
         self.connections = current_connections
 
@@ -178,128 +361,121 @@ class TCPMonitor:
     def _parse_tcpdump_line(self, line: str):
         """Parse tcpdump output to extract TCP information"""
         try:
-            # Look for TCP flags and other interesting patterns
-            if "Flags [" in line:
-                self.stats["packets_captured"] += 1
-
-                # Extract TCP flags
-                flags_match = re.search(r"Flags \[([^\]]+)\]", line)
-                if flags_match:
-                    flags = flags_match.group(1)
-
-                    # Count specific TCP operations
-                    if "S" in flags and "." not in flags:  # SYN
-                        log_message("TCP-MONITOR", f"📡 SYN packet: {line}")
-                        self.stats["syn_packets"] += 1
-                    elif "S" in flags and "." in flags:  # SYN-ACK
-                        log_message("TCP-MONITOR", f"📡 SYN-ACK packet: {line}")
-                        self.stats["synack_packets"] += 1
-                    elif "F" in flags:  # FIN
-                        log_message("TCP-MONITOR", f"📡 FIN packet: {line}")
-                        self.stats["fin_packets"] += 1
-                    elif "R" in flags:  # RST
-                        log_message("TCP-MONITOR", f"📡 RST packet: {line}")
-                        self.stats["rst_packets"] += 1
-                    elif "." in flags:  # ACK (without other flags)
-                        self.stats["ack_packets"] += 1
-                        # Only log every 10th ACK to avoid spam
-                        if self.stats["ack_packets"] % 10 == 0:
-                            log_message(
-                                "TCP-MONITOR",
-                                f"📡 Data/ACK packets: {self.stats['ack_packets']} total",
-                            )
-
-                # Extract sequence and acknowledgment numbers
-                seq_match = re.search(r"seq (\d+)", line)
-                ack_match = re.search(r"ack (\d+)", line)
-
-                if seq_match or ack_match:
-                    seq_info = f"seq={seq_match.group(1)}" if seq_match else ""
-                    ack_info = f"ack={ack_match.group(1)}" if ack_match else ""
-                    seq_ack = f"{seq_info} {ack_info}".strip()
+            # Look for TCP flags, seq and ack; the timestamp is dropped so
+            # otherwise identical lines share a cache entry
+            parsed = _classify(line.partition(" ")[2])
+            if parsed:
+                self.stats[CAPTURED] += 1
+                key, seq, ack = parsed
+
+                # Count specific TCP operations
+                if key is not None:
+                    self.stats[key] += 1
+                    label = _CLASSIFY_LABEL[key]
+                    if key == ACK:
+                        self._log_ratelimited(
+                            label,
+                            PACKET_LOG_INTERVAL,
+                            "📡 Data/ACK packets: %d total",
+                            self.stats[ACK],
+                        )
+                    else:
+                        self._log_ratelimited(
+                            label, PACKET_LOG_INTERVAL, "📡 %s packet: %s", label, line
+                        )
 
-                    # Only log interesting sequence/ack changes
-                    if self.stats["packets_captured"] % 5 == 0:
-                        log_message("TCP-MONITOR", f"📊 TCP sequence info: {seq_ack}")
+                # Sequence and acknowledgment numbers; only every 5th packet's
+                # are logged, so the text is not built for the others
+                if (seq or ack) and self.stats[CAPTURED] % 5 == 0:
+                    seq_info = f"seq={seq}" if seq else ""
+                    ack_info = f"ack={ack}" if ack else ""
+                    seq_ack = f"{seq_info} {ack_info}".strip()
+                    log_message("TCP-MONITOR", f"📊 TCP sequence info: {seq_ack}")
 
         except Exception as e:
             log_message("TCP-MONITOR", f"❌ Error parsing tcpdump line: {e}", "ERROR")
 
+    def _log_ratelimited(
+        self, key: str, min_interval: float, fmt: str, *args, level: str = "INFO"
+    ) -> bool:
+        """Log fmt % args unless the same key was logged within min_interval seconds
+
+        Formatting is deferred until the line is known to be emitted, so
+        suppressed lines cost only the timestamp comparison.
+        """
+        now = time.monotonic()
+        if now - self._last_log[key] < min_interval:
+            return False
+        self._last_log[key] = now
+        log_message("TCP-MONITOR", fmt % args, level)
+        return True
+
     def _report_stats(self):
-        """Periodically report monitoring statistics"""
-        while self.running:
-            time.sleep(15)  # Report every 15 seconds
+        """Report monitoring statistics, then schedule the next report"""
+        if not self.running:
+            return
+        schedule(STATS_INTERVAL, self._report_stats)
 
-            if (
-                self.stats["connections_established"] > 0
-                or self.stats["packets_captured"] > 0
-            ):
-                log_message("TCP-MONITOR", "📊 Monitoring Statistics:")
+        if self.stats[CONN_EST] > 0 or self.stats[CAPTURED] > 0:
+            log_message("TCP-MONITOR", "📊 Monitoring Statistics:")
 
-                # Connection statistics
-                if self.stats["connections_established"] > 0:
-                    log_message(
-                        "TCP-MONITOR",
-                        f"   🔗 Connections established: {self.stats['connections_established']}",
-                    )
-                    log_message(
-                        "TCP-MONITOR",
-                        f"   🔌 Connections closed: {self.stats['connections_closed']}",
-                    )
-                    log_message(
-                        "TCP-MONITOR",
-                        f"   📈 Active connections: {len(self.connections)}",
-                    )
+            # Connection statistics
+            if self.stats[CONN_EST] > 0:
+                log_message(
+                    "TCP-MONITOR",
+                    f"   🔗 Connections established: {self.stats[CONN_EST]}",
+                )
+                log_message(
+                    "TCP-MONITOR",
+                    f"   🔌 Connections closed: {self.stats[CONN_CLOSED]}",
+                )
+                log_message(
+                    "TCP-MONITOR",
+                    f"   📈 Active connections: {len(self.connections)}",
+                )
 
-                # Packet statistics
-                if self.stats["packets_captured"] > 0:
-                    log_message(
-                        "TCP-MONITOR",
-                        f"   📡 Total packets captured: {self.stats['packets_captured']}",
-                    )
-                    log_message(
-                        "TCP-MONITOR", f"   🔄 SYN packets: {self.stats['syn_packets']}"
-                    )
-                    log_message(
-                        "TCP-MONITOR",
-                        f"   ✅ SYN-ACK packets: {self.stats['synack_packets']}",
-                    )
+            # Packet statistics
+            if self.stats[CAPTURED] > 0:
+                log_message(
+                    "TCP-MONITOR",
+                    f"   📡 Total packets captured: {self.stats[CAPTURED]}",
+                )
+                log_message("TCP-MONITOR", f"   🔄 SYN packets: {self.stats[SYN]}")
+                log_message(
+                    "TCP-MONITOR",
+                    f"   ✅ SYN-ACK packets: {self.stats[SYNACK]}",
+                )
+                log_message(
+                    "TCP-MONITOR",
+                    f"   📨 ACK/Data packets: {self.stats[ACK]}",
+                )
+                log_message("TCP-MONITOR", f"   🔚 FIN packets: {self.stats[FIN]}")
+                log_message("TCP-MONITOR", f"   ❌ RST packets: {self.stats[RST]}")
+
+            # Connection states
+            if self.state_counts:
+                log_message("TCP-MONITOR", "   📋 Connection states observed:")
+                for state, count in self.state_counts.items():
+                    log_message("TCP-MONITOR", f"      {state}: {count} times")
+
+            # Current connections
+            if self.connections:
+                log_message("TCP-MONITOR", "   🔗 Current active connections:")
+                for conn_key, conn_info in self.connections.items():
                     log_message(
                         "TCP-MONITOR",
-                        f"   📨 ACK/Data packets: {self.stats['ack_packets']}",
+                        f"      {conn_info['local']} <-> {conn_info['remote']} ({conn_info['state']})",
                     )
-                    log_message(
-                        "TCP-MONITOR", f"   🔚 FIN packets: {self.stats['fin_packets']}"
-                    )
-                    log_message(
-                        "TCP-MONITOR", f"   ❌ RST packets: {self.stats['rst_packets']}"
-                    )
-
-                # Connection states
-                state_keys = [k for k in self.stats.keys() if k.startswith("state_")]
-                if state_keys:
-                    log_message("TCP-MONITOR", "   📋 Connection states observed:")
-                    for key in state_keys:
-                        state = key.replace("state_", "").upper()
-                        log_message(
-                            "TCP-MONITOR", f"      {state}: {self.stats[key]} times"
-                        )
-
-                # Current connections
-                if self.connections:
-                    log_message("TCP-MONITOR", "   🔗 Current active connections:")
-                    for conn_key, conn_info in self.connections.items():
-                        log_message(
-                            "TCP-MONITOR",
-                            f"      {conn_info['local']} <-> {conn_info['remote']} ({conn_info['state']})",
-                        )
-            else:
-                log_message("TCP-MONITOR", "⏳ Waiting for TCP activity to monitor...")
+        else:
+            log_message("TCP-MONITOR", "⏳ Waiting for TCP activity to monitor...")
 
     def shutdown(self):
         """Shutdown the monitor"""
         log_message("TCP-MONITOR", "🛑 Shutting down TCP monitor...")
         self.running = False
+        if self.diag_socket is not None:
+            self.diag_socket.close()
+            self.diag_socket = None
 
 
 def main():
@@ -9,27 +9,165 @@ This server demonstrates key TCP concepts:
 - Graceful connection termination
 - Socket options and buffer management
 """
+import asyncio
+import collections
+import errno
 import socket
-import threading
+import struct
 import time
 import os
 import signal
-import sys
 from shared_utils import (
     log_message,
     get_tcp_info,
-    parse_message_with_sequence,
-    create_message_with_sequence,
+    parse_message_with_sequence_bytes,
+    create_message_with_sequence_bytes,
 )
 
+# Bytes read per recv() call
+RECV_SIZE = 16384
+
+# Kernel send/receive buffer per socket, large enough to absorb bursts
+SOCKET_BUFFER_SIZE = 1 << 20
+
+# Nagle's algorithm stays on unless TCP_NODELAY=1, so small writes coalesce
+TCP_NODELAY = os.getenv("TCP_NODELAY", "0") == "1"
+
+# Most echo responses coalesced into one write before forcing a flush
+SEND_BATCH = 8
+
+# Opt-in MSG_ZEROCOPY sends (TCP_ZEROCOPY=1). Page pinning costs more than the
+# copy it saves for small writes, so only batches of this size or more use it
+TCP_ZEROCOPY = os.getenv("TCP_ZEROCOPY", "0") == "1"
+ZEROCOPY_MIN_BYTES = 16384
+
+# Linux values; the socket module only exports these names on newer Pythons
+SO_ZEROCOPY = getattr(socket, "SO_ZEROCOPY", 60)
+MSG_ZEROCOPY = getattr(socket, "MSG_ZEROCOPY", 0x4000000)
+SO_EE_ORIGIN_ZEROCOPY = 5
+
+# After a connection closes, its dup stays open this long to collect the last
+# zero-copy completions before it is closed anyway
+ZEROCOPY_CLOSE_TIMEOUT = 10.0
+
+# struct sock_extended_err: errno, origin, type, code, pad, info, data
+_SOCK_EXTENDED_ERR = struct.Struct("=IBBBxII")
+_ERRQUEUE_CMSG_SPACE = socket.CMSG_SPACE(_SOCK_EXTENDED_ERR.size)
+
+# Fixed parts of every echo response, already encoded
+_ECHO_PREFIX = b"Echo: "
+_SEQ_FMT = b" (server_seq=%d)"
+
+
+def _build_response(seq: int, message_bytes: bytes) -> bytes:
+    """Echo body for a received payload, built without a str round trip"""
+    return b"".join((_ECHO_PREFIX, message_bytes, _SEQ_FMT % seq))
+
+
+class ZeroCopySender:
+    """MSG_ZEROCOPY sends that keep each buffer alive until the kernel is done"""
+
+    def __init__(self, sock, loop: asyncio.AbstractEventLoop):
+        # A dup of the transport's socket: the same connection, but a full
+        # socket.socket that offers sendmsg() and recvmsg()
+        self.sock = sock.dup()
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, SO_ZEROCOPY, 1)
+        except OSError:
+            self.sock.close()
+            raise
+        self.loop = loop
+        self._next_id = 0
+        self._inflight = collections.deque()  # (send id, buffers) awaiting completion
+        self._watching = False  # Whether the loop is watching the dup for completions
+        self._closing = False
+        self._close_timer = None
+
+    def send(self, buffers: list) -> int:
+        """Send as much of buffers as the socket takes without copying it"""
+        try:
+            sent = self.sock.sendmsg(buffers, [], MSG_ZEROCOPY)
+        except (BlockingIOError, InterruptedError):
+            return 0
+        except OSError as e:
+            if e.errno == errno.ENOBUFS:  # Too many sends awaiting completion
+                return 0
+            raise
+
+        # The kernel numbers successful zero-copy sends from 0 and reports
+        # finished ranges of those numbers on the socket's error queue. A
+        # non-empty error queue makes the socket report an error condition,
+        # which wakes the event loop's reader for the dup while sends are pending
+        if not self._watching:
+            self.loop.add_reader(self.sock.fileno(), self._reap)
+            self._watching = True
+        self._inflight.append((self._next_id, buffers))
+        self._next_id += 1
+        return sent
+
+    def _reap(self):
+        """Release buffers whose sends have completed"""
+        while self._inflight:
+            try:
+                _, ancdata, _, _ = self.sock.recvmsg(
+                    0, _ERRQUEUE_CMSG_SPACE, socket.MSG_ERRQUEUE
+                )
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                # Completions can no longer be read. The kernel may still be
+                # using the buffers, so they stay referenced until the dup closes
+                self._stop_watching()
+                if self._closing:
+                    self._close_socket()
+                return
+            for _, _, data in ancdata:
+                if len(data) < _SOCK_EXTENDED_ERR.size:
+                    continue
+                _, origin, _, _, _, last = _SOCK_EXTENDED_ERR.unpack_from(data)
+                if origin != SO_EE_ORIGIN_ZEROCOPY:
+                    continue
+                while self._inflight and self._inflight[0][0] <= last:
+                    self._inflight.popleft()
+
+        if not self._inflight:
+            self._stop_watching()
+            if self._closing:
+                self._close_socket()
+
+    def _stop_watching(self):
+        if self._watching:
+            self.loop.remove_reader(self.sock.fileno())
+            self._watching = False
+
+    def close(self):
+        """Close the dup once every in-flight send has been reported complete"""
+        self._closing = True
+        self._reap()
+        if self._inflight and self._close_timer is None:
+            self._close_timer = self.loop.call_later(
+                ZEROCOPY_CLOSE_TIMEOUT, self._close_socket
+            )
+
+    def _close_socket(self):
+        """Close the dup, and only then let go of any unreported buffers"""
+        if self._close_timer is not None:
+            self._close_timer.cancel()
+            self._close_timer = None
+        self._stop_watching()
+        self.sock.close()
+        self._inflight.clear()
+
 
 class TCPServer:
     def __init__(self, host="0.0.0.0", port=8080):
         self.host = host
         self.port = port
         self.server_socket = None
-        self.clients = []
+        self.server = None
+        self.clients = {}  # fd -> (writer, address) of each open connection
         self.running = False
+        self._stop = None
         self.stats = {
             "connections_accepted": 0,
             "messages_received": 0,
@@ -40,17 +178,22 @@ class TCPServer:
 
     def setup_signal_handlers(self):
         """Handle graceful shutdown"""
+        loop = asyncio.get_running_loop()
 
-        def signal_handler(signum, frame):
+        def signal_handler(signum):
             log_message("TCP-SERVER", f"Received signal {signum}, shutting down...")
-            self.shutdown()
-            sys.exit(0)
+            self._stop.set()
 
-        signal.signal(signal.SIGINT, signal_handler)
-        signal.signal(signal.SIGTERM, signal_handler)
+        loop.add_signal_handler(signal.SIGINT, signal_handler, signal.SIGINT)
+        loop.add_signal_handler(signal.SIGTERM, signal_handler, signal.SIGTERM)
 
     def start(self):
         """Start the TCP server"""
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        """Accept and serve connections on one event loop until signalled"""
+        self._stop = asyncio.Event()
         self.setup_signal_handlers()
 
         # Create TCP socket
@@ -60,11 +203,23 @@ class TCPServer:
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
 
+        # Set before listen() so accepted sockets inherit them and the window
+        # scale negotiated in the handshake can cover the larger buffer
+        self.server_socket.setsockopt(
+            socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE
+        )
+        self.server_socket.setsockopt(
+            socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE
+        )
+
         # Bind to address and port
         self.server_socket.bind((self.host, self.port))
 
-        # Listen for connections
-        self.server_socket.listen(5)
+        # Listen for connections; every accepted client becomes a task running
+        # _handle_client on this loop instead of a thread of its own
+        self.server = await asyncio.start_server(
+            self._handle_client, sock=self.server_socket
+        )
         self.running = True
 
         log_message("TCP-SERVER", f"🚀 Server started on {self.host}:{self.port}")
@@ -76,137 +231,165 @@ class TCPServer:
             "TCP-SERVER", "🔄 Ready to accept TCP connections (three-way handshake)"
         )
 
-        # Start stats reporting thread
-        stats_thread = threading.Thread(target=self._stats_reporter, daemon=True)
-        stats_thread.start()
+        # Start stats reporting task
+        stats_task = asyncio.create_task(self._stats_reporter())
 
         try:
-            while self.running:
-                try:
-                    # Accept incoming connections
-                    client_socket, client_address = self.server_socket.accept()
-                    self.stats["connections_accepted"] += 1
-
-                    log_message(
-                        "TCP-SERVER",
-                        f"✅ Three-way handshake completed with {client_address}",
-                    )
-
-                    # Get detailed TCP connection info
-                    tcp_info = get_tcp_info(client_socket)
-                    log_message("TCP-SERVER", f"📋 Connection details: {tcp_info}")
-
-                    # Handle client in separate thread
-                    client_thread = threading.Thread(
-                        target=self._handle_client,
-                        args=(client_socket, client_address),
-                        daemon=True,
-                    )
-                    client_thread.start()
-
-                    self.clients.append((client_socket, client_address))
-
-                except socket.error as e:
-                    if self.running:
-                        log_message("TCP-SERVER", f"❌ Socket error: {e}", "ERROR")
-                    break
-
-        except KeyboardInterrupt:
-            log_message("TCP-SERVER", "Received interrupt, shutting down...")
+            await self._stop.wait()
         finally:
+            stats_task.cancel()
             self.shutdown()
 
-    def _handle_client(self, client_socket: socket.socket, client_address: tuple):
+    async def _handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
         """Handle individual client connection"""
+        client_socket = writer.get_extra_info("socket")
+        client_address = writer.get_extra_info("peername")
         client_id = f"{client_address[0]}:{client_address[1]}"
+        client_fd = client_socket.fileno()
+        self.stats["connections_accepted"] += 1
+
+        log_message(
+            "TCP-SERVER",
+            f"✅ Three-way handshake completed with {client_address}",
+        )
+
+        # Get detailed TCP connection info
+        tcp_info = get_tcp_info(client_socket, client_address)
+        log_message("TCP-SERVER", f"📋 Connection details: {tcp_info}")
+
+        self.clients[client_fd] = (writer, client_address)
         log_message("TCP-SERVER", f"🔗 Handling client {client_id}")
 
+        # Responses wait here until the handler is about to block on read()
+        # (or SEND_BATCH pile up) and are then handed over in one writelines()
+        loop = asyncio.get_running_loop()
+        pending = []
+
+        zerocopy = None
+        if TCP_ZEROCOPY:
+            try:
+                zerocopy = ZeroCopySender(client_socket, loop)
+            except OSError as e:
+                log_message("TCP-SERVER", f"⚠️  MSG_ZEROCOPY unavailable: {e}", "WARN")
+
+        def flush():
+            if not pending:
+                return
+            size = sum(map(len, pending))
+
+            # Zero-copy straight to the socket is only safe while the transport
+            # has nothing queued ahead of it; any unsent tail goes the usual way
+            if (
+                zerocopy is not None
+                and size >= ZEROCOPY_MIN_BYTES
+                and not writer.transport.get_write_buffer_size()
+            ):
+                sent = zerocopy.send(list(pending))
+                if sent < size:
+                    writer.write(b"".join(pending)[sent:])
+            else:
+                writer.writelines(pending)
+
+            self.stats["messages_sent"] += len(pending)
+            self.stats["bytes_sent"] += size
+            pending.clear()
+
         try:
-            # Configure client socket for demonstration
+            # Configure client socket for demonstration; asyncio turns Nagle
+            # off for every stream socket, so re-enable it unless opted out
             client_socket.setsockopt(
-                socket.IPPROTO_TCP, socket.TCP_NODELAY, 1
-            )  # Disable Nagle
+                socket.IPPROTO_TCP, socket.TCP_NODELAY, int(TCP_NODELAY)
+            )
 
             sequence_counter = 0
 
             while self.running:
-                try:
-                    # Receive data from client
-                    data = client_socket.recv(1024)
-
-                    if not data:
-                        log_message(
-                            "TCP-SERVER",
-                            f"🔌 Client {client_id} disconnected (FIN received)",
-                        )
-                        break
-
-                    self.stats["messages_received"] += 1
-                    self.stats["bytes_received"] += len(data)
-
-                    # Parse message with sequence number
-                    seq_num, timestamp, message = parse_message_with_sequence(data)
-                    receive_time = int(time.time() * 1000000)
-                    latency = receive_time - timestamp if timestamp > 0 else 0
+                # Receive data from client
+                data = await reader.read(RECV_SIZE)
 
+                if not data:
                     log_message(
                         "TCP-SERVER",
-                        f"📨 Received seq={seq_num}, latency={latency/1000:.2f}ms: '{message}'",
+                        f"🔌 Client {client_id} disconnected (FIN received)",
                     )
+                    break
 
-                    # Echo response with server sequence number
-                    sequence_counter += 1
-                    response = f"Echo: {message} (server_seq={sequence_counter})"
-                    response_data = create_message_with_sequence(
-                        sequence_counter, response
-                    )
+                self.stats["messages_received"] += 1
+                self.stats["bytes_received"] += len(data)
 
-                    # Send response
-                    bytes_sent = client_socket.send(response_data)
-                    self.stats["messages_sent"] += 1
-                    self.stats["bytes_sent"] += bytes_sent
+                # Parse message with sequence number; the raw payload is echoed
+                # back as is and only decoded for the log line
+                seq_num, timestamp, payload = parse_message_with_sequence_bytes(data)
+                message = str(payload, "utf-8", errors="ignore")
+                receive_time = int(time.time() * 1000000)
+                latency = receive_time - timestamp if timestamp > 0 else 0
 
-                    log_message(
-                        "TCP-SERVER",
-                        f"📤 Sent seq={sequence_counter}, bytes={bytes_sent}: '{response}'",
-                    )
+                log_message(
+                    "TCP-SERVER",
+                    f"📨 Received seq={seq_num}, latency={latency/1000:.2f}ms: '{message}'",
+                )
 
-                    # Demonstrate flow control - slow down if too many messages
-                    if self.stats["messages_received"] % 10 == 0:
-                        log_message(
-                            "TCP-SERVER",
-                            "⏳ Flow control: brief pause to demonstrate backpressure",
-                        )
-                        time.sleep(0.5)
+                # Echo response with server sequence number
+                sequence_counter += 1
+                response_data = create_message_with_sequence_bytes(
+                    sequence_counter, _build_response(sequence_counter, payload)
+                )
 
-                except socket.timeout:
-                    continue
-                except socket.error as e:
+                # Queue response; read() returns without yielding while data
+                # is buffered, so a call_soon flush only runs once it would block
+                pending.append(response_data)
+                if len(pending) >= SEND_BATCH:
+                    flush()
+                elif len(pending) == 1:
+                    loop.call_soon(flush)
+                bytes_sent = len(response_data)
+
+                # drain() only waits while the peer's window is full
+                await writer.drain()
+
+                log_message(
+                    "TCP-SERVER",
+                    f"📤 Sent seq={sequence_counter}, bytes={bytes_sent}: "
+                    f"'Echo: {message} (server_seq={sequence_counter})'",
+                )
+
+                # Demonstrate flow control - slow down if too many messages
+                if self.stats["messages_received"] % 10 == 0:
                     log_message(
                         "TCP-SERVER",
-                        f"❌ Client {client_id} socket error: {e}",
-                        "ERROR",
+                        "⏳ Flow control: brief pause to demonstrate backpressure",
                     )
-                    break
+                    await asyncio.sleep(0.5)
 
+        except OSError as e:
+            log_message(
+                "TCP-SERVER",
+                f"❌ Client {client_id} socket error: {e}",
+                "ERROR",
+            )
         except Exception as e:
             log_message(
                 "TCP-SERVER", f"❌ Error handling client {client_id}: {e}", "ERROR"
             )
         finally:
-            try:
-                client_socket.close()
-                log_message(
-                    "TCP-SERVER",
-                    f"🔌 Connection to {client_id} closed (four-way handshake)",
-                )
-            except Exception:
-                pass
+            # Deregister before close() so a new connection reusing the fd is kept
+            self.clients.pop(client_fd, None)
+            if not writer.is_closing():
+                flush()
+            writer.close()
+            if zerocopy is not None:
+                zerocopy.close()
+            log_message(
+                "TCP-SERVER",
+                f"🔌 Connection to {client_id} closed (four-way handshake)",
+            )
 
-    def _stats_reporter(self):
+    async def _stats_reporter(self):
         """Report server statistics periodically"""
         while self.running:
-            time.sleep(10)
+            await asyncio.sleep(10)
             if self.stats["connections_accepted"] > 0:
                 log_message(
                     "TCP-SERVER",
@@ -221,17 +404,17 @@ class TCPServer:
         self.running = False
 
         # Close all client connections
-        for client_socket, client_address in self.clients:
+        for writer, client_address in list(self.clients.values()):
             try:
-                client_socket.close()
+                writer.close()
                 log_message("TCP-SERVER", f"🔌 Closed connection to {client_address}")
             except Exception:
                 pass
 
         # Close server socket
-        if self.server_socket:
+        if self.server:
             try:
-                self.server_socket.close()
+                self.server.close()
                 log_message("TCP-SERVER", "🔌 Server socket closed")
             except Exception:
                 pass
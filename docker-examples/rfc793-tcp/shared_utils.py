@@ -1,86 +1,200 @@
 """Shared utilities for TCP demonstration"""
+import atexit
+import os
+import queue
+import sched
 import socket
 import struct
+import sys
+import threading
 import time
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+# Formatted timestamp of the last log line, recomputed only when the second changes
+_last_sec = 0
+_last_ts = ""
+
+# Log lines from every thread are queued and written to stdout by one writer
+# thread, which coalesces whatever has accumulated into a single writev().
+# The thread is started by the first log_message() call.
+_LOG_Q = queue.SimpleQueue()
+_LOG_BATCH_MAX = 1024  # IOV_MAX on Linux
+_log_writer_started = False
+_log_writer_lock = threading.Lock()
+
+# Message header: 4-byte sequence number + 8-byte microsecond timestamp
+_HDR = struct.Struct("!IQ")
+
+
+def _log_writer():
+    """Drain the log queue, writing each batch of lines with one syscall"""
+    while True:
+        batch = [_LOG_Q.get()]
+        while len(batch) < _LOG_BATCH_MAX:
+            try:
+                batch.append(_LOG_Q.get_nowait())
+            except queue.Empty:
+                break
+
+        lines = [item.encode() for item in batch if isinstance(item, str)]
+        if lines:
+            try:
+                # Anything printed through sys.stdout's buffer goes out first
+                sys.stdout.flush()
+                _write_all(sys.stdout.fileno(), lines)
+            except (OSError, ValueError) as e:
+                sys.stderr.write(
+                    f"log writer: failed to write {len(lines)} lines: {e}\n"
+                )
+
+        # flush_logs() markers are released once everything before them is written
+        for item in batch:
+            if isinstance(item, threading.Event):
+                item.set()
+
+
+def _write_all(fd: int, lines: list):
+    """writev() every line, resubmitting whatever a short write left behind"""
+    i = 0
+    while i < len(lines):
+        written = os.writev(fd, lines[i:])
+        while i < len(lines) and written >= len(lines[i]):
+            written -= len(lines[i])
+            i += 1
+        if written:
+            lines[i] = lines[i][written:]
+
+
+def _start_log_writer():
+    global _log_writer_started
+    with _log_writer_lock:
+        if not _log_writer_started:
+            threading.Thread(target=_log_writer, name="log-writer", daemon=True).start()
+            _log_writer_started = True
+
+
+def flush_logs(timeout: float = 1.0):
+    """Block until every line logged so far has been written"""
+    if not _log_writer_started:
+        return
+    done = threading.Event()
+    _LOG_Q.put(done)
+    done.wait(timeout)
+
+
+atexit.register(flush_logs)
 
 
 def log_message(component: str, message: str, level: str = "INFO"):
     """Consistent logging format across all components"""
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}] {component:12} {level:5} | {message}")
+    global _last_sec, _last_ts
+    now = int(time.time())
+    if now != _last_sec:
+        _last_ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+        _last_sec = now
+    if not _log_writer_started:
+        _start_log_writer()
+    _LOG_Q.put(f"[{_last_ts}] {component:12} {level:5} | {message}\n")
 
 
-def get_tcp_info(sock: socket.socket) -> Dict[str, Any]:
-    """Extract TCP connection information where available"""
-    info = {
-        "local_addr": sock.getsockname(),
-        "peer_addr": None,
-        "tcp_nodelay": None,
-        "keepalive": None,
-        "recv_buffer": None,
-        "send_buffer": None,
-    }
+# Periodic jobs from every component share one timer thread driving a
+# sched.scheduler instead of each sleeping in a thread of its own. Its delay
+# function waits on _SCHED_WAKE so schedule() can interrupt a long wait when
+# an earlier job is added. The thread is started by the first schedule() call.
+_SCHED_WAKE = threading.Event()
+_scheduler_started = False
+_scheduler_lock = threading.Lock()
+
+
+def _sched_delay(timeout):
+    _SCHED_WAKE.wait(timeout)
+    _SCHED_WAKE.clear()
+
 
-    try:
-        info["peer_addr"] = sock.getpeername()
-    except Exception:
-        pass
+_SCHED = sched.scheduler(time.monotonic, _sched_delay)
 
-    try:
-        info["tcp_nodelay"] = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
-    except Exception:
-        pass
 
-    try:
-        info["keepalive"] = sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE)
-    except Exception:
-        pass
+def _scheduler_loop():
+    """Run due jobs, idling until schedule() adds one when the queue is empty"""
+    while True:
+        _SCHED.run()
+        _sched_delay(None)
 
-    try:
-        info["recv_buffer"] = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
-        info["send_buffer"] = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
-    except Exception:
-        pass
 
-    return info
+def _start_scheduler():
+    global _scheduler_started
+    with _scheduler_lock:
+        if not _scheduler_started:
+            threading.Thread(
+                target=_scheduler_loop, name="scheduler", daemon=True
+            ).start()
+            _scheduler_started = True
+
+
+def schedule(delay: float, action, *args) -> sched.Event:
+    """Run action(*args) on the shared scheduler thread after delay seconds"""
+    event = _SCHED.enter(delay, 1, action, args)
+    if not _scheduler_started:
+        _start_scheduler()
+    _SCHED_WAKE.set()
+    return event
+
+
+def get_tcp_info(
+    sock: socket.socket, peer_addr: Optional[tuple] = None
+) -> Dict[str, Any]:
+    """Extract TCP connection information from a connected socket
+
+    Pass peer_addr when it is already known (e.g. from accept()) to skip the
+    getpeername() call.
+    """
+    getsockopt = sock.getsockopt
+    return {
+        "local_addr": sock.getsockname(),
+        "peer_addr": peer_addr or sock.getpeername(),
+        "tcp_nodelay": getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY),
+        "keepalive": getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE),
+        "recv_buffer": getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+        "send_buffer": getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF),
+    }
+
+
+# Names of the eight TCP header flag bits, lowest bit first
+_FLAG_NAMES = ("FIN", "SYN", "RST", "PSH", "ACK", "URG", "ECE", "CWR")
+
+# Human-readable form of every possible flags byte, built once at import
+_FLAG_STR = [
+    " | ".join(name for bit, name in enumerate(_FLAG_NAMES) if i & (1 << bit)) or "None"
+    for i in range(256)
+]
 
 
 def format_tcp_flags(flags: int) -> str:
     """Convert TCP flags to human-readable format"""
-    flag_names = []
-    if flags & 0x01:
-        flag_names.append("FIN")
-    if flags & 0x02:
-        flag_names.append("SYN")
-    if flags & 0x04:
-        flag_names.append("RST")
-    if flags & 0x08:
-        flag_names.append("PSH")
-    if flags & 0x10:
-        flag_names.append("ACK")
-    if flags & 0x20:
-        flag_names.append("URG")
-    if flags & 0x40:
-        flag_names.append("ECE")
-    if flags & 0x80:
-        flag_names.append("CWR")
-
-    return " | ".join(flag_names) if flag_names else "None"
+    return _FLAG_STR[flags & 0xFF]
 
 
 def create_message_with_sequence(sequence: int, message: str) -> bytes:
     """Create a message with sequence number for tracking"""
+    return create_message_with_sequence_bytes(sequence, message.encode("utf-8"))
+
+
+def create_message_with_sequence_bytes(sequence: int, payload: bytes) -> bytes:
+    """Create a message with sequence number from an already-encoded payload"""
     timestamp = int(time.time() * 1000000)  # microseconds
-    header = struct.pack("!IQ", sequence, timestamp)  # Network byte order
-    return header + message.encode("utf-8")
+    return _HDR.pack(sequence, timestamp) + payload  # Network byte order
 
 
 def parse_message_with_sequence(data: bytes) -> tuple[int, int, str]:
-    """Parse message with sequence number"""
-    if len(data) < 12:  # 4 bytes seq + 8 bytes timestamp
-        return 0, 0, data.decode("utf-8", errors="ignore")
+    """Parse message with sequence number (accepts bytes or a memoryview)"""
+    sequence, timestamp, payload = parse_message_with_sequence_bytes(data)
+    return sequence, timestamp, str(payload, "utf-8", errors="ignore")
+
+
+def parse_message_with_sequence_bytes(data: bytes) -> tuple[int, int, bytes]:
+    """Parse message with sequence number, leaving the payload undecoded"""
+    if len(data) < _HDR.size:  # 4 bytes seq + 8 bytes timestamp
+        return 0, 0, data
 
-    sequence, timestamp = struct.unpack("!IQ", data[:12])
-    message = data[12:].decode("utf-8", errors="ignore")
-    return sequence, timestamp, message
+    sequence, timestamp = _HDR.unpack_from(data)
+    return sequence, timestamp, data[_HDR.size :]
@@ -9,29 +9,58 @@ This client demonstrates SMTP protocol concepts:
 - Message formatting and transmission
 - Error handling and retries
 """
+import asyncio
 import smtplib
+import threading
 import time
 import os
 import sys
 import socket
+from collections import defaultdict
+from dataclasses import replace
 from datetime import datetime
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from shared_smtp_utils import (
     log_message,
+    log_lazy,
     EmailMessage,
     create_sample_emails,
     simulate_mx_lookup,
     format_mx_records,
 )
 
+# MX records rarely change, so lookups are cached per domain for this long
+MX_CACHE_TTL = 300
+
+# Domains with no MX records are remembered for a shorter time
+MX_NEGATIVE_TTL = 60
+
+# Final statistics, logged as one multi-line message
+STATS_REPORT = (
+    "📊 SMTP Client Statistics:\n"
+    "   📧 Emails sent successfully: {emails_sent}\n"
+    "   ❌ Emails failed: {emails_failed}\n"
+    "   🔍 MX lookups performed: {mx_lookups}\n"
+    "   🔌 SMTP connections: {connections}\n"
+    "   💥 Connection failures: {connection_failures}"
+)
+
+# setsockopt() arguments applied to every SMTP connection. Commands and
+# replies are small writes, so Nagle's algorithm would hold each one back
+DEFAULT_SOCKET_OPTIONS = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
+
 
 class RFC821SMTPClient:
     """SMTP client demonstrating RFC 821 concepts"""
 
-    def __init__(self, smtp_host="smtp-server", smtp_port=25):
+    def __init__(self, smtp_host="smtp-server", smtp_port=25, socket_options=None):
         self.smtp_host = smtp_host
         self.smtp_port = smtp_port
+        # (level, option, value) tuples, e.g. add SO_KEEPALIVE for long sessions
+        self.socket_options = (
+            DEFAULT_SOCKET_OPTIONS if socket_options is None else socket_options
+        )
         self.stats = {
             "emails_sent": 0,
             "emails_failed": 0,
@@ -39,6 +68,13 @@ class RFC821SMTPClient:
             "connections": 0,
             "connection_failures": 0,
         }
+        # Concurrent sends update stats from worker threads
+        self._stats_lock = threading.Lock()
+        # Connection kept open across send_sample_emails, and its (host, port)
+        self._server = None
+        self._server_addr = None
+        # domain -> (mx_records, expiry time from time.monotonic())
+        self._mx_cache: dict[str, tuple[list, float]] = {}
 
     def demonstrate_mx_lookup(self, recipient_email: str) -> tuple[str, int]:
         """Demonstrate MX record lookup process"""
@@ -51,12 +87,21 @@ class RFC821SMTPClient:
             return None, None
 
         domain = recipient_email.split("@")[1]
-        self.stats["mx_lookups"] += 1
 
-        # Simulate DNS MX lookup
-        mx_records = simulate_mx_lookup(domain)
+        entry = self._mx_cache.get(domain)
+        now = time.monotonic()
+        if entry and now < entry[1]:
+            mx_records = entry[0]
+            log_message("SMTP-CLIENT", f"💾 Using cached MX records for {domain}")
+        else:
+            self.stats["mx_lookups"] += 1
+
+            # Simulate DNS MX lookup
+            mx_records = simulate_mx_lookup(domain)
+            ttl = MX_CACHE_TTL if mx_records else MX_NEGATIVE_TTL
+            self._mx_cache[domain] = (mx_records, now + ttl)
         log_message("SMTP-CLIENT", f"📋 MX records for {domain}:")
-        log_message("SMTP-CLIENT", f"\n{format_mx_records(mx_records)}")
+        log_lazy("SMTP-CLIENT", lambda: f"\n{format_mx_records(mx_records)}")
 
         # Choose the highest priority (lowest number) MX record
         if mx_records:
@@ -87,86 +132,216 @@ class RFC821SMTPClient:
         log_message("SMTP-CLIENT", f"   To: {', '.join(email.recipients)}")
 
         try:
-            # Demonstrate MX lookup for first recipient
-            if email.recipients:
-                mx_host, mx_port = self.demonstrate_mx_lookup(email.recipients[0])
-                if not mx_host:
-                    return False
-            else:
-                mx_host, mx_port = self.smtp_host, self.smtp_port
+            mx_host, mx_port = self._resolve_recipient(email)
+            if not mx_host:
+                return False
 
-            # Connect to SMTP server
-            log_message("SMTP-CLIENT", f"🔌 Connecting to {mx_host}:{mx_port}")
-            server = smtplib.SMTP()
-            server.set_debuglevel(1)  # Enable debug output
+            server = self._open_connection(mx_host, mx_port)
+            self._send_on_connection(server, email)
 
-            # Connect
-            connection_start = time.time()
-            server.connect(mx_host, mx_port)
-            connection_time = (time.time() - connection_start) * 1000
+            # QUIT
+            server.quit()
+            log_message("SMTP-CLIENT", "👋 SMTP session closed with QUIT")
+            return True
 
+        except smtplib.SMTPException as e:
+            log_message("SMTP-CLIENT", f"❌ SMTP error: {e}", "ERROR")
+            self.stats["emails_failed"] += 1
+            return False
+        except socket.error as e:
+            log_message("SMTP-CLIENT", f"❌ Connection error: {e}", "ERROR")
+            self.stats["connection_failures"] += 1
+            return False
+        except Exception as e:
+            log_message("SMTP-CLIENT", f"❌ Unexpected error: {e}", "ERROR")
+            self.stats["emails_failed"] += 1
+            return False
+
+    def _resolve_recipient(self, email: EmailMessage) -> tuple[str, int]:
+        """Pick the server to deliver to from the first recipient's MX records"""
+        # Demonstrate MX lookup for first recipient
+        if email.recipients:
+            return self.demonstrate_mx_lookup(email.recipients[0])
+        return self.smtp_host, self.smtp_port
+
+    def _open_connection(self, mx_host: str, mx_port: int) -> smtplib.SMTP:
+        """Connect to an SMTP server and greet it with HELLO"""
+        # Connect to SMTP server
+        log_message("SMTP-CLIENT", f"🔌 Connecting to {mx_host}:{mx_port}")
+        server = smtplib.SMTP()
+        server.set_debuglevel(1)  # Enable debug output
+
+        # Connect
+        connection_start = time.time()
+        server.connect(mx_host, mx_port)
+        connection_time = (time.time() - connection_start) * 1000
+
+        for option in self.socket_options:
+            server.sock.setsockopt(*option)
+
+        with self._stats_lock:
             self.stats["connections"] += 1
-            log_message("SMTP-CLIENT", f"✅ Connected in {connection_time:.2f}ms")
+        log_message("SMTP-CLIENT", f"✅ Connected in {connection_time:.2f}ms")
 
-            # HELLO command
-            log_message("SMTP-CLIENT", "🤝 Sending HELLO command")
-            server.hello("smtp-client.company.com")
+        # HELLO command
+        log_message("SMTP-CLIENT", "🤝 Sending HELLO command")
+        server.helo("smtp-client.company.com")
+        return server
 
-            # Demonstrate the full SMTP transaction
-            log_message("SMTP-CLIENT", "📨 Starting SMTP transaction")
+    def _send_on_connection(self, server: smtplib.SMTP, email: EmailMessage):
+        """Run one MAIL FROM / RCPT TO / DATA transaction on an open connection"""
+        # Demonstrate the full SMTP transaction
+        log_message("SMTP-CLIENT", "📨 Starting SMTP transaction")
 
-            # MAIL FROM
-            log_message("SMTP-CLIENT", f"📤 MAIL FROM: {email.sender}")
+        # MAIL FROM
+        log_message("SMTP-CLIENT", f"📤 MAIL FROM: {email.sender}")
 
-            # RCPT TO (for each recipient)
-            for recipient in email.recipients:
-                log_message("SMTP-CLIENT", f"📥 RCPT TO: {recipient}")
+        # RCPT TO (for each recipient)
+        for recipient in email.recipients:
+            log_message("SMTP-CLIENT", f"📥 RCPT TO: {recipient}")
 
-            # Format message
-            message = self._format_message(email)
+        # Format message
+        message = self._format_message(email)
 
-            # Send the email
-            send_start = time.time()
-            server.sendmail(email.sender, email.recipients, message)
-            send_time = (time.time() - send_start) * 1000
+        # Send the email
+        send_start = time.time()
+        server.sendmail(email.sender, email.recipients, message)
+        send_time = (time.time() - send_start) * 1000
 
-            log_message(
-                "SMTP-CLIENT", f"✅ Email sent successfully in {send_time:.2f}ms"
-            )
-            log_message("SMTP-CLIENT", f"📊 Message size: {len(message)} bytes")
-
-            # QUIT
-            server.quit()
-            log_message("SMTP-CLIENT", "👋 SMTP session closed with QUIT")
+        log_message("SMTP-CLIENT", f"✅ Email sent successfully in {send_time:.2f}ms")
+        log_message("SMTP-CLIENT", f"📊 Message size: {len(message)} bytes")
 
+        with self._stats_lock:
             self.stats["emails_sent"] += 1
+
+    def connect_persistent(self, mx_host: str = None, mx_port: int = None) -> bool:
+        """Open a connection that is reused for several emails"""
+        mx_host = mx_host or self.smtp_host
+        mx_port = mx_port or self.smtp_port
+        try:
+            self._server = self._open_connection(mx_host, mx_port)
+            self._server_addr = (mx_host, mx_port)
+            log_message("SMTP-CLIENT", "🔁 Keeping connection open for reuse")
             return True
+        except (smtplib.SMTPException, socket.error) as e:
+            log_message("SMTP-CLIENT", f"❌ Connection error: {e}", "ERROR")
+            self.stats["connection_failures"] += 1
+            self._server = None
+            self._server_addr = None
+            return False
+
+    def close_persistent(self):
+        """QUIT and close the reused connection, if one is open"""
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+            log_message("SMTP-CLIENT", "👋 SMTP session closed with QUIT")
+        except (smtplib.SMTPException, socket.error):
+            self._server.close()
+        finally:
+            self._server = None
+            self._server_addr = None
+
+    def _drop_persistent(self):
+        """Close a reused connection that can no longer carry a QUIT"""
+        self._server.close()
+        self._server = None
+        self._server_addr = None
+
+    def _persistent_connection_matches(self, mx_host: str, mx_port: int) -> bool:
+        """Check the reused connection is open and points at mx_host
+
+        A connection the server has dropped is not probed for here; sending on
+        it fails and the retry loop in send_email_persistent() reconnects.
+        """
+        if self._server is None:
+            return False
+        if self._server_addr != (mx_host, mx_port):
+            self.close_persistent()
+            return False
+        return True
+
+    def send_email_persistent(self, email: EmailMessage) -> bool:
+        """Send email over the reused connection instead of a new session"""
+        log_message("SMTP-CLIENT", f"📧 Sending email: '{email.subject}'")
+        log_message("SMTP-CLIENT", f"   From: {email.sender}")
+        log_message("SMTP-CLIENT", f"   To: {', '.join(email.recipients)}")
+
+        try:
+            mx_host, mx_port = self._resolve_recipient(email)
+            if not mx_host:
+                self.stats["emails_failed"] += 1
+                return False
+
+            # If the connection drops mid-transaction, reconnect and retry once
+            for attempt in range(2):
+                if not self._persistent_connection_matches(mx_host, mx_port):
+                    if not self.connect_persistent(mx_host, mx_port):
+                        break
+
+                try:
+                    log_message("SMTP-CLIENT", "♻️ Reusing open SMTP connection")
+                    self._send_on_connection(self._server, email)
+                    return True
+                except (smtplib.SMTPServerDisconnected, socket.error) as e:
+                    log_message("SMTP-CLIENT", f"❌ Connection lost: {e}", "ERROR")
+                    self._drop_persistent()
+                    self.stats["connection_failures"] += 1
+                    if attempt == 0:
+                        log_message("SMTP-CLIENT", "🔄 Reconnecting to retry email")
+
+            self.stats["emails_failed"] += 1
+            return False
 
         except smtplib.SMTPException as e:
             log_message("SMTP-CLIENT", f"❌ SMTP error: {e}", "ERROR")
             self.stats["emails_failed"] += 1
             return False
-        except socket.error as e:
-            log_message("SMTP-CLIENT", f"❌ Connection error: {e}", "ERROR")
-            self.stats["connection_failures"] += 1
-            return False
         except Exception as e:
             log_message("SMTP-CLIENT", f"❌ Unexpected error: {e}", "ERROR")
             self.stats["emails_failed"] += 1
             return False
 
+    # Custom headers to demonstrate RFC concepts; identical on every email
+    _STATIC_HEADERS = (
+        "X-Mailer: RFC821-Demo-Client/1.0\r\n"
+        "X-SMTP-Demo: This email demonstrates RFC 821 concepts\r\n"
+    )
+
     def _format_message(self, email: EmailMessage) -> str:
         """Format email message according to RFC standards"""
-        # Create multipart message
-        msg = MIMEMultipart()
-        msg["From"] = email.sender
-        msg["To"] = ", ".join(email.recipients)
-        msg["Subject"] = email.subject
-        msg["Date"] = (
+        date = (
             email.timestamp.strftime("%a, %d %b %Y %H:%M:%S %z")
             if email.timestamp
             else ""
         )
+        to = ", ".join(email.recipients)
+
+        # Plain ASCII text needs no transfer encoding, so the message is written
+        # out directly instead of building and serializing a MIME tree
+        if all(
+            field.isascii() for field in (email.sender, to, email.subject, email.body)
+        ):
+            return (
+                f"From: {email.sender}\r\n"
+                f"To: {to}\r\n"
+                f"Subject: {email.subject}\r\n"
+                f"Date: {date}\r\n"
+                f"Message-ID: {email.message_id}\r\n"
+                "MIME-Version: 1.0\r\n"
+                'Content-Type: text/plain; charset="us-ascii"\r\n'
+                "Content-Transfer-Encoding: 7bit\r\n"
+                f"{self._STATIC_HEADERS}\r\n"
+                f"{email.body}"
+            )
+
+        # Create multipart message
+        msg = MIMEMultipart()
+        msg["From"] = email.sender
+        msg["To"] = to
+        msg["Subject"] = email.subject
+        msg["Date"] = date
         msg["Message-ID"] = email.message_id
 
         # Add body
@@ -221,6 +396,9 @@ class RFC821SMTPClient:
 
         sample_emails = create_sample_emails()
 
+        # One SMTP session carries every email instead of connect/HELLO/QUIT each
+        self.connect_persistent()
+
         for i in range(count):
             # Use sample emails cyclically
             email = sample_emails[i % len(sample_emails)]
@@ -232,7 +410,7 @@ class RFC821SMTPClient:
             log_message("SMTP-CLIENT", f"📨 Sending email {i+1}/{count}")
 
             # Send the email
-            success = self.send_email_raw_smtp(email)
+            success = self.send_email_persistent(email)
 
             if success:
                 log_message("SMTP-CLIENT", f"✅ Email {i+1} sent successfully")
@@ -255,31 +433,89 @@ class RFC821SMTPClient:
                 )
                 time.sleep(actual_delay)
 
-    def print_statistics(self):
-        """Print client statistics"""
-        log_message("SMTP-CLIENT", "📊 SMTP Client Statistics:")
-        log_message(
-            "SMTP-CLIENT",
-            f"   📧 Emails sent successfully: {self.stats['emails_sent']}",
-        )
-        log_message(
-            "SMTP-CLIENT", f"   ❌ Emails failed: {self.stats['emails_failed']}"
-        )
+        self.close_persistent()
+
+    async def send_sample_emails_async(self, count: int = 5):
+        """Send sample emails with one concurrent SMTP session per MX server"""
         log_message(
-            "SMTP-CLIENT", f"   🔍 MX lookups performed: {self.stats['mx_lookups']}"
+            "SMTP-CLIENT", f"📧 Sending {count} sample emails concurrently by MX server"
         )
+
+        sample_emails = create_sample_emails()
+
+        # Group the emails by the server their first recipient resolves to
+        batches = defaultdict(list)
+        for i in range(count):
+            email = replace(
+                sample_emails[i % len(sample_emails)],
+                timestamp=datetime.now(),
+                message_id=f"demo-{i+1}-{int(time.time())}@company.com",
+            )
+            mx_host, mx_port = self._resolve_recipient(email)
+            if mx_host:
+                batches[(mx_host, mx_port)].append(email)
+            else:
+                log_message("SMTP-CLIENT", f"❌ Email {i+1} has no route", "ERROR")
+                self.stats["emails_failed"] += 1
+
         log_message(
-            "SMTP-CLIENT", f"   🔌 SMTP connections: {self.stats['connections']}"
+            "SMTP-CLIENT", f"⚡ Opening {len(batches)} SMTP session(s) in parallel"
         )
-        log_message(
-            "SMTP-CLIENT",
-            f"   💥 Connection failures: {self.stats['connection_failures']}",
+
+        # smtplib blocks, so each session runs in a worker thread; sessions to
+        # different servers overlap instead of waiting on one another
+        start = time.time()
+        await asyncio.gather(
+            *(
+                asyncio.to_thread(self._send_batch, mx_host, mx_port, emails)
+                for (mx_host, mx_port), emails in batches.items()
+            )
         )
+        elapsed = (time.time() - start) * 1000
+        log_message("SMTP-CLIENT", f"✅ All sessions finished in {elapsed:.2f}ms")
+
+    def _send_batch(self, mx_host: str, mx_port: int, emails: list[EmailMessage]):
+        """Send emails in order over one dedicated SMTP session"""
+        try:
+            server = self._open_connection(mx_host, mx_port)
+        except (smtplib.SMTPException, socket.error) as e:
+            log_message("SMTP-CLIENT", f"❌ Connection error: {e}", "ERROR")
+            with self._stats_lock:
+                self.stats["connection_failures"] += 1
+                self.stats["emails_failed"] += len(emails)
+            return
+
+        try:
+            for sent, email in enumerate(emails):
+                try:
+                    self._send_on_connection(server, email)
+                except smtplib.SMTPServerDisconnected as e:
+                    log_message("SMTP-CLIENT", f"❌ Connection lost: {e}", "ERROR")
+                    with self._stats_lock:
+                        self.stats["connection_failures"] += 1
+                        self.stats["emails_failed"] += len(emails) - sent
+                    return
+                except smtplib.SMTPException as e:
+                    log_message("SMTP-CLIENT", f"❌ SMTP error: {e}", "ERROR")
+                    with self._stats_lock:
+                        self.stats["emails_failed"] += 1
+
+            server.quit()
+            log_message("SMTP-CLIENT", "👋 SMTP session closed with QUIT")
+        except (smtplib.SMTPException, socket.error) as e:
+            log_message("SMTP-CLIENT", f"❌ Connection error: {e}", "ERROR")
+            server.close()
+
+    def print_statistics(self):
+        """Print client statistics"""
+        report = STATS_REPORT.format_map(self.stats)
 
         if self.stats["emails_sent"] + self.stats["emails_failed"] > 0:
             total = self.stats["emails_sent"] + self.stats["emails_failed"]
             success_rate = (self.stats["emails_sent"] / total) * 100
-            log_message("SMTP-CLIENT", f"   📈 Success rate: {success_rate:.1f}%")
+            report += f"\n   📈 Success rate: {success_rate:.1f}%"
+
+        log_message("SMTP-CLIENT", report)
 
 
 def main():
@@ -287,6 +523,7 @@ def main():
     smtp_port = int(os.getenv("SMTP_PORT", 25))
     email_count = int(os.getenv("EMAIL_COUNT", 5))
     delay_seconds = float(os.getenv("DELAY_SECONDS", 3.0))
+    concurrent_send = os.getenv("CONCURRENT_SEND", "0") == "1"
 
     log_message("SMTP-CLIENT", "🎯 RFC 821 SMTP Client Demonstration")
     log_message(
@@ -312,7 +549,10 @@ def main():
             sys.exit(1)
 
         # Send sample emails
-        client.send_sample_emails(email_count, delay_seconds)
+        if concurrent_send:
+            asyncio.run(client.send_sample_emails_async(email_count))
+        else:
+            client.send_sample_emails(email_count, delay_seconds)
 
         # Demonstrate different response scenarios
         log_message("SMTP-CLIENT", "🧪 Demonstrating SMTP response scenarios...")
@@ -330,6 +570,7 @@ def main():
     except Exception as e:
         log_message("SMTP-CLIENT", f"❌ Unexpected error: {e}", "ERROR")
     finally:
+        client.close_persistent()
         client.print_statistics()
         log_message("SMTP-CLIENT", "🏁 SMTP client demonstration completed")
 
@@ -11,13 +11,36 @@ Features demonstrated:
 - Priority-based mail server selection
 - Integration with SMTP delivery process
 """
+import re
+import selectors
 import socket
 import threading
 import time
 import os
 import signal
 import sys
-from shared_smtp_utils import log_message, simulate_mx_lookup
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from shared_smtp_utils import log_enabled, log_message, simulate_mx_lookup
+
+# How often the query loop wakes up to notice shutdown when no queries arrive
+SELECT_TIMEOUT = 0.5
+
+# Periodic statistics, logged as one multi-line message
+STATS_REPORT = (
+    "📊 DNS Simulator Statistics:\n"
+    "   🔍 Total queries received: {queries_received}\n"
+    "   📧 MX queries processed: {mx_queries}\n"
+    "   📤 Responses sent: {responses_sent}\n"
+    "   ❌ Errors: {errors}\n"
+    "📋 Available MX records:"
+)
+
+# Worker threads answering queries, so the receive loop only drains the socket
+QUERY_WORKERS = 8
+
+# Responses remembered per raw query, so client retries skip the domain scan
+RESPONSE_CACHE_SIZE = 512
 
 
 class DNSSimulator:
@@ -47,6 +70,27 @@ class DNSSimulator:
             "test.com": [(10, "smtp-server.test.com")],
         }
 
+        self._domain_re = self._compile_domain_matcher()
+
+        # Raw query bytes -> (matched domain or None, response), oldest first.
+        # Unknown domains are cached too, as NXDOMAIN verdicts
+        self._response_cache: OrderedDict[bytes, tuple] = OrderedDict()
+
+        # Queries are answered on worker threads; the lock guards stats and cache
+        self._pool = ThreadPoolExecutor(
+            max_workers=QUERY_WORKERS, thread_name_prefix="dns-query"
+        )
+        self._lock = threading.Lock()
+
+    def _compile_domain_matcher(self) -> re.Pattern:
+        """Build one regex that finds any configured domain in a single scan
+
+        Longer domains are listed first so the most specific name wins. The
+        pattern is bytes so raw packets can be searched without decoding.
+        """
+        domains = sorted(self.mx_records, key=len, reverse=True)
+        return re.compile(b"|".join(re.escape(d.encode("utf-8")) for d in domains))
+
     def setup_signal_handlers(self):
         """Handle graceful shutdown"""
 
@@ -74,6 +118,10 @@ class DNSSimulator:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self.sock.bind((self.host, self.port))
 
+            # Pick up any MX records added after construction
+            self._domain_re = self._compile_domain_matcher()
+            self._response_cache.clear()
+
             log_message("DNS-SIMULATOR", "🚀 DNS simulator ready")
             log_message(
                 "DNS-SIMULATOR",
@@ -84,45 +132,32 @@ class DNSSimulator:
             stats_thread = threading.Thread(target=self._stats_reporter, daemon=True)
             stats_thread.start()
 
-            # Main DNS query processing loop
-            while self.running:
-                try:
-                    # Receive DNS query
-                    data, client_addr = self.sock.recvfrom(512)
-
-                    if not self.running:
-                        break
-
-                    self.stats["queries_received"] += 1
-                    log_message(
-                        "DNS-SIMULATOR",
-                        f"📥 DNS query from {client_addr[0]}:{client_addr[1]}",
-                    )
-
-                    # Process the query (simplified)
-                    response = self._process_dns_query(data, client_addr)
-
-                    if response:
-                        # Send response
-                        self.sock.sendto(response, client_addr)
-                        self.stats["responses_sent"] += 1
-                        log_message(
-                            "DNS-SIMULATOR",
-                            f"📤 Sent DNS response to {client_addr[0]}:{client_addr[1]}",
-                        )
-
-                except socket.timeout:
-                    continue
-                except socket.error as e:
-                    if self.running:
-                        log_message("DNS-SIMULATOR", f"❌ Socket error: {e}", "ERROR")
-                        self.stats["errors"] += 1
-                except Exception as e:
-                    if self.running:
-                        log_message(
-                            "DNS-SIMULATOR", f"❌ Error processing query: {e}", "ERROR"
-                        )
-                        self.stats["errors"] += 1
+            # Main DNS query processing loop: a non-blocking socket driven by a
+            # selector, so shutdown is noticed and every queued query is handled
+            # per wakeup
+            self.sock.setblocking(False)
+            with selectors.DefaultSelector() as selector:
+                selector.register(self.sock, selectors.EVENT_READ)
+                while self.running:
+                    try:
+                        if not selector.select(timeout=SELECT_TIMEOUT):
+                            continue
+
+                        while self.running:
+                            try:
+                                # Receive DNS query
+                                data, client_addr = self.sock.recvfrom(512)
+                            except BlockingIOError:
+                                break
+                            self._pool.submit(self._handle_query, data, client_addr)
+
+                    except socket.error as e:
+                        if self.running:
+                            log_message(
+                                "DNS-SIMULATOR", f"❌ Socket error: {e}", "ERROR"
+                            )
+                            with self._lock:
+                                self.stats["errors"] += 1
 
         except Exception as e:
             log_message(
@@ -131,47 +166,107 @@ class DNSSimulator:
         finally:
             self.stop()
 
+    def _handle_query(self, data: bytes, client_addr: tuple):
+        """Answer one received DNS query (runs on a worker thread)"""
+        try:
+            with self._lock:
+                self.stats["queries_received"] += 1
+            log_message(
+                "DNS-SIMULATOR",
+                f"📥 DNS query from {client_addr[0]}:{client_addr[1]}",
+            )
+
+            # Process the query (simplified)
+            response = self._process_dns_query(data, client_addr)
+
+            if response:
+                # Send response
+                self.sock.sendto(response, client_addr)
+                with self._lock:
+                    self.stats["responses_sent"] += 1
+                log_message(
+                    "DNS-SIMULATOR",
+                    f"📤 Sent DNS response to {client_addr[0]}:{client_addr[1]}",
+                )
+
+        except socket.error as e:
+            if self.running:
+                log_message("DNS-SIMULATOR", f"❌ Socket error: {e}", "ERROR")
+                with self._lock:
+                    self.stats["errors"] += 1
+        except Exception as e:
+            if self.running:
+                log_message("DNS-SIMULATOR", f"❌ Error processing query: {e}", "ERROR")
+                with self._lock:
+                    self.stats["errors"] += 1
+
     def _process_dns_query(self, data: bytes, client_addr: tuple) -> bytes:
         """Process DNS query and return response (simplified implementation)"""
         try:
-            # This is a very simplified DNS query processor
-            # In a real implementation, you'd parse the DNS protocol properly
+            with self._lock:
+                cached = self._response_cache.get(data)
+                if cached is not None:
+                    self._response_cache.move_to_end(data)
+            if cached is not None:
+                domain, response = cached
+                if domain:
+                    with self._lock:
+                        self.stats["mx_queries"] += 1
+                    log_message("DNS-SIMULATOR", f"💾 Cached MX answer for: {domain}")
+                else:
+                    log_message("DNS-SIMULATOR", "💾 Cached NXDOMAIN answer", "WARN")
+                return response
+
+            domain, response = self._resolve_query(data)
+
+            with self._lock:
+                self._response_cache[data] = (domain, response)
+                if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                    self._response_cache.popitem(last=False)
+            return response
 
-            # For demonstration, we'll just look for domain names in the query
-            query_str = data.decode("utf-8", errors="ignore").lower()
+        except Exception as e:
+            log_message("DNS-SIMULATOR", f"❌ Error processing DNS query: {e}", "ERROR")
+            return None
 
-            # Check for MX queries
-            for domain in self.mx_records.keys():
-                if domain in query_str:
-                    log_message("DNS-SIMULATOR", f"🔍 MX query detected for: {domain}")
-                    self.stats["mx_queries"] += 1
+    def _resolve_query(self, data: bytes) -> tuple:
+        """Match a query against the configured domains: (domain, response)"""
+        # This is a very simplified DNS query processor
+        # In a real implementation, you'd parse the DNS protocol properly
 
-                    # Get MX records for this domain
-                    mx_records = self.mx_records[domain]
+        # For demonstration, we'll just look for domain names in the query
+        # (bytes.lower() only folds ASCII, which is all a DNS name may contain)
+        query = data.lower()
 
-                    log_message(
-                        "DNS-SIMULATOR",
-                        f"📋 Found {len(mx_records)} MX record(s) for {domain}:",
-                    )
-                    for priority, server in mx_records:
-                        log_message(
-                            "DNS-SIMULATOR", f"   Priority {priority}: {server}"
-                        )
+        # Check for MX queries
+        match = self._domain_re.search(query)
+        if match:
+            domain = match.group().decode("utf-8")
+            log_message("DNS-SIMULATOR", f"🔍 MX query detected for: {domain}")
+            with self._lock:
+                self.stats["mx_queries"] += 1
 
-                    # Create a simple response (not proper DNS format, just for demo)
-                    response_text = f"MX:{domain}:"
-                    for priority, server in mx_records:
-                        response_text += f"{priority},{server};"
+            # Get MX records for this domain
+            mx_records = self.mx_records[domain]
 
-                    return response_text.encode("utf-8")
+            log_message(
+                "DNS-SIMULATOR",
+                f"📋 Found {len(mx_records)} MX record(s) for {domain}:",
+            )
+            if log_enabled():
+                for priority, server in mx_records:
+                    log_message("DNS-SIMULATOR", f"   Priority {priority}: {server}")
 
-            # If no MX record found
-            log_message("DNS-SIMULATOR", "❓ No MX records found for query", "WARN")
-            return b"NXDOMAIN"
+            # Create a simple response (not proper DNS format, just for demo)
+            response_text = f"MX:{domain}:"
+            for priority, server in mx_records:
+                response_text += f"{priority},{server};"
 
-        except Exception as e:
-            log_message("DNS-SIMULATOR", f"❌ Error processing DNS query: {e}", "ERROR")
-            return None
+            return domain, response_text.encode("utf-8")
+
+        # If no MX record found
+        log_message("DNS-SIMULATOR", "❓ No MX records found for query", "WARN")
+        return None, b"NXDOMAIN"
 
     def _stats_reporter(self):
         """Report DNS statistics periodically"""
@@ -179,26 +274,14 @@ class DNSSimulator:
             time.sleep(20)  # Report every 20 seconds
 
             if self.stats["queries_received"] > 0:
-                log_message("DNS-SIMULATOR", "📊 DNS Simulator Statistics:")
-                log_message(
-                    "DNS-SIMULATOR",
-                    f"   🔍 Total queries received: {self.stats['queries_received']}",
-                )
-                log_message(
-                    "DNS-SIMULATOR",
-                    f"   📧 MX queries processed: {self.stats['mx_queries']}",
-                )
-                log_message(
-                    "DNS-SIMULATOR",
-                    f"   📤 Responses sent: {self.stats['responses_sent']}",
-                )
-                log_message("DNS-SIMULATOR", f"   ❌ Errors: {self.stats['errors']}")
+                report = [STATS_REPORT.format_map(self.stats)]
 
                 # Show configured domains
-                log_message("DNS-SIMULATOR", "📋 Available MX records:")
                 for domain, records in self.mx_records.items():
                     servers = ", ".join([f"{srv}({pri})" for pri, srv in records])
-                    log_message("DNS-SIMULATOR", f"   {domain}: {servers}")
+                    report.append(f"   {domain}: {servers}")
+
+                log_message("DNS-SIMULATOR", "\n".join(report))
 
     def demonstrate_mx_resolution(self):
         """Demonstrate MX resolution process"""
@@ -226,6 +309,9 @@ class DNSSimulator:
         log_message("DNS-SIMULATOR", "🛑 Shutting down DNS simulator...")
         self.running = False
 
+        # Drop queries still waiting for a worker; the socket is about to close
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
         if self.sock:
             try:
                 self.sock.close()
@@ -1,17 +1,37 @@
 """Shared utilities for SMTP demonstration"""
+import os
 import time
 import hashlib
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from dataclasses import dataclass, asdict
 from datetime import datetime
 
 
+_LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "ERROR": 40}
+
+# Messages below this level are dropped, e.g. LOG_LEVEL=WARN quiets the demo
+LOG_LEVEL = _LOG_LEVELS.get(os.getenv("LOG_LEVEL", "INFO").upper(), 20)
+
+
+def log_enabled(level: str = "INFO") -> bool:
+    """Whether messages at this level are printed"""
+    return _LOG_LEVELS.get(level, 20) >= LOG_LEVEL
+
+
 def log_message(component: str, message: str, level: str = "INFO"):
     """Consistent logging format across all SMTP components"""
+    if not log_enabled(level):
+        return
     timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{timestamp}] {component:12} {level:5} | {message}")
 
 
+def log_lazy(component: str, build_message: Callable[[], str], level: str = "INFO"):
+    """Like log_message, but only builds the message if it will be printed"""
+    if log_enabled(level):
+        log_message(component, build_message(), level)
+
+
 @dataclass
 class EmailMessage:
     """Represents an email message"""